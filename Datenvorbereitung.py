@@ -1,33 +1,35 @@
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-import matplotlib.pyplot as plt
 
-# CSV einlesen
-df = pd.read_csv("aggregierte_verbindungen.csv")
+from datastore import read_dataset, write_dataset
 
-# Neue Spalte: Passagiere pro Flug (abgerundet)
-df["PAX_PRO_FLUG"] = np.floor(df["PASSENGERS"] / df["DEPARTURES_PERFORMED"])
 
-# Optional: Ergebnis anzeigen
-print(df[["PASSENGERS", "DEPARTURES_PERFORMED", "PAX_PRO_FLUG"]].head())
+def add_kennzahlen(df):
+    # Neue Spalte: Passagiere pro Flug (abgerundet)
+    df["PAX_PRO_FLUG"] = np.floor(df["PASSENGERS"] / df["DEPARTURES_PERFORMED"])
 
-# Optional: Zwischenspeichern
-df.to_csv("verbindungen_mit_pax_pro_flug.csv", index=False)
+    # Neue Spalte: Auslastungsgrad berechnen
+    df["AUSLASTUNG"] = df["PASSENGERS"] / df["SEATS"]
 
-print("✅ Passagiere pro Flug berechnet und gespeichert.")
+    # Optional: Begrenzung (falls Auslastung > 1 durch fehlerhafte Daten)
+    df["AUSLASTUNG"] = df["AUSLASTUNG"].clip(upper=1.0)
 
-# Neue Spalte: Auslastungsgrad berechnen
-df["AUSLASTUNG"] = df["PASSENGERS"] / df["SEATS"]
+    return df
 
-# Optional: Begrenzung (falls Auslastung > 1 durch fehlerhafte Daten)
-df["AUSLASTUNG"] = df["AUSLASTUNG"].clip(upper=1.0)
 
-# Vorschau anzeigen
-print(df[["PASSENGERS", "SEATS", "AUSLASTUNG"]].head())
+if __name__ == "__main__":
+    # Aggregierte Verbindungen laden
+    df = add_kennzahlen(read_dataset("aggregiert"))
 
-# Ergebnis speichern
-df.to_csv("verbindungen_mit_kennzahlen.csv", index=False)
+    # Optional: Ergebnis anzeigen
+    print(df[["PASSENGERS", "DEPARTURES_PERFORMED", "PAX_PRO_FLUG"]].head())
 
-print("✅ Auslastungsgrad berechnet und gespeichert.")
+    print("✅ Passagiere pro Flug berechnet.")
 
+    # Vorschau anzeigen
+    print(df[["PASSENGERS", "SEATS", "AUSLASTUNG"]].head())
+
+    # Ergebnis speichern
+    write_dataset(df, "kennzahlen")
+
+    print("✅ Auslastungsgrad berechnet und gespeichert.")
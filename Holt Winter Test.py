@@ -4,9 +4,12 @@ from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_squared_error
 
+from datastore import read_dataset
+from connection_index import ConnectionIndex, CONNECTION_KEYS
+
 
 # Datei einlesen
-df = pd.read_csv("verbindungen_mit_kennzahlen.csv")
+df = read_dataset("kennzahlen", columns=["AIRLINE_ID", "UNIQUE_CARRIER_ENTITY", "ORIGIN", "DEST", "AIRCRAFT_TYPE", "YEAR", "MONTH", "PASSENGERS"])
 
 # Verbindung auswählen (Beispiel)
 verbindung = {
@@ -18,18 +21,12 @@ verbindung = {
 }
 
 
-# Nur Daten für diese Verbindung
-mask = (df["AIRLINE_ID"] == verbindung["AIRLINE_ID"]) & \
-       (df["UNIQUE_CARRIER_ENTITY"] == verbindung["UNIQUE_CARRIER_ENTITY"]) & \
-       (df["ORIGIN"] == verbindung["ORIGIN"]) & \
-       (df["DEST"] == verbindung["DEST"]) & \
-       (df["AIRCRAFT_TYPE"] == verbindung["AIRCRAFT_TYPE"])
-
-df_verbindung = df[mask].copy()
+# Nur Daten für diese Verbindung (bereits nach YEAR/MONTH sortiert)
+verbindungen = ConnectionIndex(df, CONNECTION_KEYS)
+df_verbindung = verbindungen.get([verbindung[c] for c in CONNECTION_KEYS]).copy()
 
-# Sortieren & Zeitachse erzeugen
+# Zeitachse erzeugen
 df_verbindung["DATE"] = pd.to_datetime(df_verbindung["YEAR"].astype(str) + "-" + df_verbindung["MONTH"].astype(str) + "-01")
-df_verbindung.sort_values("DATE", inplace=True)
 
 
 # Zeitreihe (2022+2023) → Trainingsdaten
@@ -1,151 +1,215 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 from sklearn.metrics import mean_squared_error
 
-# === CSV-Dateien laden ===
-df_passed = pd.read_csv("passed_connections.csv", dtype={"UNIQUE_CARRIER_ENTITY": str})
-df_data = pd.read_csv("verbindungen_mit_kennzahlen.csv", dtype={"UNIQUE_CARRIER_ENTITY": str})
-
-# === Zeitachse erzeugen ===
-df_data["DATE"] = pd.to_datetime(df_data["YEAR"].astype(str) + "-" + df_data["MONTH"].astype(str).str.zfill(2) + "-01")
-df_data.sort_values("DATE", inplace=True)
-
-# === Ergebnisliste vorbereiten ===
-results = []
-
-# === Über alle gültigen Verbindungen iterieren ===
-for _, row in df_passed.iterrows():
-    verbindung = {
-        "AIRLINE_ID": row["AIRLINE_ID"],
-        "UNIQUE_CARRIER_ENTITY": row["UNIQUE_CARRIER_ENTITY"],
-        "ORIGIN": row["ORIGIN"],
-        "DEST": row["DEST"],
-        "AIRCRAFT_TYPE": row["AIRCRAFT_TYPE"]
-    }
-
-    # Verbindung filtern
-    mask = (
-        (df_data["AIRLINE_ID"] == verbindung["AIRLINE_ID"]) &
-        (df_data["UNIQUE_CARRIER_ENTITY"] == verbindung["UNIQUE_CARRIER_ENTITY"]) &
-        (df_data["ORIGIN"] == verbindung["ORIGIN"]) &
-        (df_data["DEST"] == verbindung["DEST"]) &
-        (df_data["AIRCRAFT_TYPE"] == verbindung["AIRCRAFT_TYPE"])
-    )
-    df_verbindung = df_data[mask].copy()
+from metric_cube import cube_for
+import hw_batch
+
+KEY_COLS = ["AIRLINE_ID", "UNIQUE_CARRIER_ENTITY", "ORIGIN", "DEST", "AIRCRAFT_TYPE"]
+
+# Standard-Initialisierung je Engine: statsmodels wie bisher "estimated"; hw_batch
+# nur mit der gegen statsmodels abgeglichenen "legacy-heuristic" (hw_batch.py)
+INIT_STANDARD = {"statsmodels": "estimated", "batch": "legacy-heuristic"}
+
+
+def load_data():
+    # === Daten laden ===
+    df_passed = pd.read_csv("passed_connections.csv", dtype={"UNIQUE_CARRIER_ENTITY": str})
+
+    # === Zeitreihen: Würfel Verbindung × Monat (metric_cube) ===
+    cube = cube_for()
+
+    return df_passed, cube
+
+
+def split_series(df_passed, cube):
+    # Trainings- und Testreihe je qualifizierter Verbindung direkt aus ihrer Würfelzeile
+    for row in df_passed[KEY_COLS].itertuples(index=False):
+        yield dict(zip(KEY_COLS, row)), split_train_test(cube, tuple(row))
 
-    # Trainingsdaten (2022–2023)
-    train = df_verbindung[df_verbindung["YEAR"] < 2024].set_index("DATE")["PASSENGERS"]
-    test = df_verbindung[df_verbindung["YEAR"] == 2024].set_index("DATE")["PASSENGERS"]
+
+def split_train_test(cube, verbindung):
+    # Trainingsdaten (2022–2023) und Test (2024), nur vorhandene Monate; float64
+    try:
+        row = cube.rows(verbindung).start
+    except KeyError:
+        return None
+
+    present = ~cube.fehlt[row]
+    passengers = cube.matrix("PASSENGERS")[row]
+    in_train = present & (cube.dates.year < 2024)
+    in_test = present & (cube.dates.year == 2024)
+    train = pd.Series(passengers[in_train], index=cube.dates[in_train].rename("DATE"), name="PASSENGERS")
+    test = pd.Series(passengers[in_test], index=cube.dates[in_test].rename("DATE"), name="PASSENGERS")
 
     # Nur vollständige Reihen verarbeiten
     if train.isna().any() or len(train) < 24 or len(test) < 12:
-        continue
+        return None
 
-    try:
-        model = ExponentialSmoothing(
-            train,
-            seasonal="add",
-            trend="add",
-            seasonal_periods=12,
-            initialization_method="estimated"
-        )
-        fit = model.fit()
-        forecast = fit.forecast(12)
-
-        # Vergleich mit echten Werten
-        common_index = forecast.index.intersection(test.index)
-        y_true = test.loc[common_index]
-        y_pred = forecast.loc[common_index]
-
-        rmse = np.sqrt(mean_squared_error(y_true, y_pred))
-        mape = np.mean(np.abs((y_true - y_pred) / y_true)) * 100
+    return train, test
+
+
+def score(forecast, test):
+    # Prognose + echte Werte auf gemeinsamen Monaten
+    merged = pd.merge(
+        pd.DataFrame({"DATE": forecast.index, "FORECAST": forecast.values}),
+        pd.DataFrame({"DATE": test.index, "TRUE": test.values}),
+        on="DATE",
+        how="inner"
+    )
+
+    y_true = merged["TRUE"]
+    y_pred = merged["FORECAST"]
+
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    mape = np.mean(np.abs((y_true - y_pred) / y_true)) * 100
+
+    return rmse, mape, merged
 
+
+def evaluate_connection(split, initialization="estimated"):
+    if split is None:
+        return None
+    train, test = split
+
+    model = ExponentialSmoothing(
+        train,
+        seasonal="add",
+        trend="add",
+        seasonal_periods=12,
+        initialization_method=initialization
+    )
+    fit = model.fit()
+    forecast = fit.forecast(12)
+
+    return score(forecast, test)
+
+
+
+def _evaluate_task(task):
+    # Läuft im Worker-Prozess; Fehler werden pro Verbindung zurückgegeben statt verschluckt
+    verbindung, split, initialization = task
+    try:
+        return verbindung, evaluate_connection(split, initialization), None
+    except Exception as e:
+        return verbindung, None, f"{type(e).__name__}: {e}"
+
+
+def _evaluate_batch(series, initialization):
+    # Alle vollständigen Verbindungen als Matrix in einem gebündelten Fit (hw_batch)
+    verbindungen = []
+    splits = []
+    for verbindung, split in series:
+        verbindungen.append(verbindung)
+        splits.append(split)
+
+    complete = [split for split in splits if split is not None]
+    if complete:
+        Y = np.vstack([train.to_numpy(dtype=float) for train, _ in complete])
+        forecasts = iter(hw_batch.fit(Y, m=12, h=12, initialization=initialization)["forecast"])
+
+    for verbindung, split in zip(verbindungen, splits):
+        if split is None:
+            yield verbindung, None, None
+            continue
+        train, test = split
+        dates = pd.date_range(train.index[-1] + pd.offsets.MonthBegin(), periods=12, freq="MS")
+        yield verbindung, score(pd.Series(next(forecasts), index=dates), test), None
+
+
+def evaluate(df_passed, cube, workers=1, chunksize=8, engine="statsmodels", initialization=None):
+    # Jedes Modell wird genau einmal gefittet; dieselbe Prognose liefert die
+    # Kennzahlen je Verbindung und den Beitrag zur monatlichen Gesamtsumme.
+    # Mit workers > 1 laufen die Fits in einem Prozess-Pool; pool.map liefert
+    # die Ergebnisse in Eingabereihenfolge, daher identisch zum seriellen Lauf.
+    # engine="batch" fittet alle Verbindungen gemeinsam mit hw_batch.
+    # initialization=None -> INIT_STANDARD der Engine.
+    if initialization is None:
+        initialization = INIT_STANDARD[engine]
+    if engine == "batch" and initialization == "estimated":
+        print("⚠️ hw_batch mit 'estimated' ist nicht gegen statsmodels abgeglichen, "
+              "die Prognosen weichen deutlich ab (validiert: legacy-heuristic).")
+    series = split_series(df_passed, cube)
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    if engine == "batch":
+        outcomes = _evaluate_batch(series, initialization)
+    elif workers > 1:
+        tasks = ((verbindung, split, initialization) for verbindung, split in series)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_evaluate_task, tasks, chunksize=chunksize))
+    else:
+        tasks = ((verbindung, split, initialization) for verbindung, split in series)
+        outcomes = map(_evaluate_task, tasks)
+
+    results = []
+    fehler = []
+    gesamt_forecasts = []
+
+    for verbindung, evaluation, error in outcomes:
+        if error is not None:
+            print(f"⚠️ Fehler bei Verbindung {verbindung}: {error}")
+            fehler.append({**verbindung, "FEHLER": error})
+            continue
+
+        if evaluation is None:
+            continue
+
+        rmse, mape, merged = evaluation
         results.append({
             **verbindung,
             "RMSE": rmse,
             "MAPE": mape
         })
+        gesamt_forecasts.append(merged)
 
-    except Exception as e:
-        # Optional: Logging oder Fehlerausgabe
-        print(f"⚠️ Fehler bei Verbindung {verbindung}: {e}")
-        continue
-
-# === Ergebnisse als DataFrame ===
-df_results = pd.DataFrame(results)
-
-# === Ausgabe anzeigen ===
-print(df_results.head())
-print(f"\n✅ Gesamt: {len(df_results)} Verbindungen erfolgreich ausgewertet.")
-
-
-# === Monatliche Gesamtwerte sammeln ===
-gesamt_forecasts = []
-gesamt_true = []
-
-# Nochmals über die Verbindungen gehen und Forecasts speichern
-for _, row in df_passed.iterrows():
-    verbindung = {
-        "AIRLINE_ID": row["AIRLINE_ID"],
-        "UNIQUE_CARRIER_ENTITY": row["UNIQUE_CARRIER_ENTITY"],
-        "ORIGIN": row["ORIGIN"],
-        "DEST": row["DEST"],
-        "AIRCRAFT_TYPE": row["AIRCRAFT_TYPE"]
-    }
-
-    mask = (
-        (df_data["AIRLINE_ID"] == verbindung["AIRLINE_ID"]) &
-        (df_data["UNIQUE_CARRIER_ENTITY"] == verbindung["UNIQUE_CARRIER_ENTITY"]) &
-        (df_data["ORIGIN"] == verbindung["ORIGIN"]) &
-        (df_data["DEST"] == verbindung["DEST"]) &
-        (df_data["AIRCRAFT_TYPE"] == verbindung["AIRCRAFT_TYPE"])
-    )
-    df_verbindung = df_data[mask].copy()
-
-    train = df_verbindung[df_verbindung["YEAR"] < 2024].set_index("DATE")["PASSENGERS"]
-    test = df_verbindung[df_verbindung["YEAR"] == 2024].set_index("DATE")["PASSENGERS"]
+    df_results = pd.DataFrame(results)
+    df_fehler = pd.DataFrame(fehler, columns=KEY_COLS + ["FEHLER"])
 
-    if train.isna().any() or len(train) < 24 or len(test) < 12:
-        continue
+    # === Alle Prognosen & echten Werte zusammenführen ===
+    df_gesamt = pd.concat(gesamt_forecasts)
+    df_monatlich = df_gesamt.groupby("DATE").sum()
 
-    try:
-        model = ExponentialSmoothing(
-            train,
-            seasonal="add",
-            trend="add",
-            seasonal_periods=12,
-            initialization_method="estimated"
-        )
-        fit = model.fit()
-        forecast = fit.forecast(12)
-
-        # Speichern von Prognose + echten Werten
-        forecast_df = pd.DataFrame({
-            "DATE": forecast.index,
-            "FORECAST": forecast.values
-        })
+    return df_results, df_monatlich, df_fehler
 
-        test_df = pd.DataFrame({
-            "DATE": test.index,
-            "TRUE": test.values
-        })
 
-        merged = pd.merge(forecast_df, test_df, on="DATE", how="inner")
-        gesamt_forecasts.append(merged)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Anzahl Prozesse (0 = alle Kerne)")
+    parser.add_argument("--chunksize", type=int, default=8, help="Verbindungen pro Pool-Auftrag")
+    parser.add_argument("--engine", choices=["statsmodels", "batch"], default="statsmodels", help="batch = alle Verbindungen gemeinsam mit hw_batch")
+    parser.add_argument("--init", choices=["estimated", "legacy-heuristic"], default=None,
+                        help="initialization_method; Standard: estimated (statsmodels) bzw. legacy-heuristic (batch), "
+                             "batch mit estimated ist nicht validiert")
+    args = parser.parse_args()
 
-    except:
-        continue
+    df_passed, cube = load_data()
 
-# === Alle Prognosen & echten Werte zusammenführen ===
-df_gesamt = pd.concat(gesamt_forecasts)
-df_monatlich = df_gesamt.groupby("DATE").sum()
+    df_results, df_monatlich, df_fehler = evaluate(
+        df_passed, cube,
+        workers=args.workers or None,
+        chunksize=args.chunksize,
+        engine=args.engine,
+        initialization=args.init
+    )
 
+    # === Ausgabe anzeigen ===
+    print(df_results.head())
+    print(f"\n✅ Gesamt: {len(df_results)} Verbindungen erfolgreich ausgewertet.")
+    if len(df_fehler):
+        print(f"⚠️ {len(df_fehler)} Verbindungen mit Fehler.")
 
-rmse_gesamt = np.sqrt(mean_squared_error(df_monatlich["TRUE"], df_monatlich["FORECAST"]))
-mape_gesamt = np.mean(np.abs((df_monatlich["TRUE"] - df_monatlich["FORECAST"]) / df_monatlich["TRUE"])) * 100
+    rmse_gesamt = np.sqrt(mean_squared_error(df_monatlich["TRUE"], df_monatlich["FORECAST"]))
+    mape_gesamt = np.mean(np.abs((df_monatlich["TRUE"] - df_monatlich["FORECAST"]) / df_monatlich["TRUE"])) * 100
 
-# === Ergebnis ausgeben ===
-print("\n📊 Gesamter Fehler über alle Verbindungen:")
-print(f"✅ Gesamt-RMSE: {rmse_gesamt:.2f} Passagiere")
-print(f"✅ Gesamt-MAPE: {mape_gesamt:.2f}%")
+    # === Ergebnis ausgeben ===
+    print("\n📊 Gesamter Fehler über alle Verbindungen:")
+    print(f"✅ Gesamt-RMSE: {rmse_gesamt:.2f} Passagiere")
+    print(f"✅ Gesamt-MAPE: {mape_gesamt:.2f}%")
@@ -0,0 +1,282 @@
+import os
+import time
+import logging
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import hw_batch
+from datastore import read_dataset, DATA_DIR
+from connection_index import CONNECTION_KEYS
+from forecast_models import MODELLE
+
+# === Rolling-Origin-Backtesting ===
+# Jede qualifizierte Verbindung wird an vielen Prognoseursprüngen bewertet statt
+# nur am Split 2023/2024. Am Ursprung e wird auf den Monaten [start, e) trainiert
+# und h = 1..horizont Monate vorausgesagt; expanding: start = 0, sliding: feste
+# Fensterbreite. Ergebnis ist je Modell und Horizont RMSE/MAPE über alle
+# Verbindungen und Ursprünge.
+#
+# Aufeinanderfolgende Ursprünge bauen aufeinander auf statt neu zu fitten:
+#   LR       geschlossene Lösung über kumulierte Summen, O(1) je Ursprung
+#   HW       hw_batch für alle Verbindungen zugleich, je Ursprung voll gefittet
+#            mit der gegen statsmodels abgeglichenen legacy-heuristic (ein
+#            Warmstart fände andere Optima als das validierte Verfahren)
+#   ARIMA,   Zustand wird mit append/apply fortgeschrieben; nur alle refit_every
+#   SARIMA   Ursprünge neu geschätzt, dann mit den bisherigen Parametern als Start
+#   PROPHET  Parameter des vorigen Fits als Startwerte für Stan
+# Modellkonfiguration wie in forecast_models (Dashboard).
+
+FENSTER = ["expanding", "sliding"]
+
+ERGEBNIS_CSV = os.path.join(DATA_DIR, "backtest_horizonte.csv")
+
+
+def load_series(passed_csv="passed_connections.csv"):
+    # Matrix Verbindungen × Monate der qualifizierten, lückenlosen Verbindungen
+    df_passed = pd.read_csv(passed_csv, dtype={"UNIQUE_CARRIER_ENTITY": str})
+    df = read_dataset("kennzahlen", columns=CONNECTION_KEYS + ["YEAR", "MONTH", "PASSENGERS"])
+
+    table = df.pivot_table(
+        index=CONNECTION_KEYS, columns=["YEAR", "MONTH"], values="PASSENGERS",
+        aggfunc="sum", observed=True
+    )
+    dates = pd.to_datetime([f"{year}-{month:02d}-01" for year, month in table.columns])
+    table.columns = range(len(dates))
+
+    # Reihenfolge wie in passed_connections.csv
+    table = df_passed[CONNECTION_KEYS].merge(table.reset_index(), on=CONNECTION_KEYS, how="inner")
+    keys = table[CONNECTION_KEYS]
+    values = table.drop(columns=CONNECTION_KEYS)
+
+    complete = values.notna().all(axis=1).to_numpy()
+    Y = values.to_numpy(dtype=float)[complete]
+    return Y, dates, keys[complete].reset_index(drop=True)
+
+
+def origins(T, min_train=24, step=1, window="expanding", breite=None):
+    # (start, end): Training auf den Monaten [start, end), Prognose ab end
+    if window not in FENSTER:
+        raise ValueError(f"Unbekanntes Fenster: {window}")
+    breite = breite or min_train
+    splits = []
+    for end in range(min_train, T, step):
+        start = 0 if window == "expanding" else end - breite
+        splits.append((start, end))
+    return splits
+
+
+def _future_dates(dates, end, horizont):
+    return pd.date_range(dates[end - 1], periods=horizont + 1, freq="MS")[1:]
+
+
+# --- LR: alle Verbindungen und Ursprünge in geschlossener Form ---
+
+def _backtest_lr(Y, dates, splits, horizont):
+    # Regressor wie in forecast_models: Tage seit Beginn (Verschiebung ändert die Prognose nicht)
+    T = Y.shape[1]
+    all_dates = dates.append(_future_dates(dates, T, horizont))
+    x = (all_dates - dates[0]).days.to_numpy(dtype=float)
+
+    def cumulative(a):
+        return np.concatenate([np.zeros(a.shape[:-1] + (1,)), np.cumsum(a, axis=-1)], axis=-1)
+
+    Sx, Sxx = cumulative(x[:T]), cumulative(x[:T] ** 2)
+    Sy, Sxy = cumulative(Y), cumulative(Y * x[:T])
+
+    F = np.empty((len(Y), len(splits), horizont))
+    for j, (start, end) in enumerate(splits):
+        n = end - start
+        sx, sxx = Sx[end] - Sx[start], Sxx[end] - Sxx[start]
+        sy, sxy = Sy[:, end] - Sy[:, start], Sxy[:, end] - Sxy[:, start]
+        slope = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+        intercept = (sy - slope * sx) / n
+        F[:, j, :] = intercept[:, None] + slope[:, None] * x[end:end + horizont]
+    return F
+
+
+# --- HW: gebündelt ---
+
+def _backtest_hw(Y, splits, horizont):
+    F = np.empty((len(Y), len(splits), horizont))
+    for j, (start, end) in enumerate(splits):
+        F[:, j, :] = hw_batch.fit(Y[:, start:end], m=12, h=horizont, initialization="legacy-heuristic")["forecast"]
+    return F
+
+
+# --- ARIMA/SARIMA/Prophet: je Verbindung, Zustand über die Ursprünge fortgeschrieben ---
+
+def _statespace_model(modell, train):
+    if modell == "ARIMA":
+        from statsmodels.tsa.arima.model import ARIMA
+        return ARIMA(train, order=(1, 1, 1))
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    return SARIMAX(train, order=(1, 1, 1), seasonal_order=(1, 1, 1, 12))
+
+
+def _backtest_statespace(modell, series, splits, horizont, refit_every):
+    fit_kwargs = {} if modell == "ARIMA" else {"disp": False}
+    F = np.full((len(splits), horizont), np.nan)
+    res = None
+    previous = None
+    for j, (start, end) in enumerate(splits):
+        train = series.iloc[start:end]
+        try:
+            if res is None:
+                res = _statespace_model(modell, train).fit(**fit_kwargs)
+            else:
+                # fit_kwargs nur beim Neuschätzen (ohne gehen sie an filter) und als Kopie,
+                # weil statsmodels das Dict verändert
+                refit = refit_every > 0 and j % refit_every == 0
+                kwargs = dict(fit_kwargs) if refit else None
+                if start == previous[0]:
+                    # expanding: nur die neuen Monate anhängen
+                    res = res.append(series.iloc[previous[1]:end], refit=refit, fit_kwargs=kwargs)
+                else:
+                    # sliding: gleiches Modell auf das verschobene Fenster anwenden
+                    res = res.apply(train, refit=refit, fit_kwargs=kwargs)
+            F[j] = np.asarray(res.forecast(horizont), dtype=float)
+        except Exception:
+            # Nächster Ursprung startet ohne Vorwissen
+            res = None
+        previous = (start, end)
+    return F
+
+
+def _prophet_init(model):
+    # Startwerte für Stan aus einem gefitteten Modell (siehe Prophet-Doku "Updating fitted models")
+    init = {name: model.params[name][0][0] for name in ["k", "m", "sigma_obs"]}
+    for name in ["delta", "beta"]:
+        init[name] = model.params[name][0]
+    return init
+
+
+def _backtest_prophet(series, splits, horizont):
+    from prophet import Prophet
+
+    F = np.full((len(splits), horizont), np.nan)
+    init = None
+    for j, (start, end) in enumerate(splits):
+        history = pd.DataFrame({"ds": series.index[start:end], "y": series.to_numpy()[start:end]})
+        future = pd.DataFrame({"ds": _future_dates(series.index, end, horizont)})
+        try:
+            try:
+                model = Prophet()
+                model.fit(history, init=init)
+            except Exception:
+                # Fit mit Startwerten fehlgeschlagen -> ohne Startwerte wiederholen
+                model = Prophet()
+                model.fit(history)
+            F[j] = model.predict(future)["yhat"].to_numpy()
+            init = _prophet_init(model)
+        except Exception:
+            # Ursprung bleibt NaN (in horizon_table als FEHLER gezählt), der nächste startet ohne Vorwissen
+            init = None
+    return F
+
+
+def _connection_task(task):
+    modell, y, dates, splits, horizont, refit_every = task
+    warnings.simplefilter("ignore")
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+    series = pd.Series(y, index=pd.DatetimeIndex(dates, freq="MS"))
+    if modell == "PROPHET":
+        return _backtest_prophet(series, splits, horizont)
+    return _backtest_statespace(modell, series, splits, horizont, refit_every)
+
+
+def backtest(Y, dates, modelle=MODELLE, window="expanding", min_train=24, breite=None,
+             horizont=12, step=1, workers=1, chunksize=4, refit_every=3):
+    # Rückgabe: Ursprünge, {Modell: Prognosen (Verbindungen × Ursprünge × Horizont)}, {Modell: Sekunden}
+    splits = origins(Y.shape[1], min_train, step, window, breite)
+    forecasts = {}
+    seconds = {}
+
+    for modell in modelle:
+        if modell not in MODELLE:
+            raise ValueError(f"Unbekanntes Modell: {modell}")
+    sequential = [m for m in modelle if m in ("ARIMA", "SARIMA", "PROPHET")]
+
+    for modell in [m for m in modelle if m not in sequential]:
+        started = time.perf_counter()
+        forecasts[modell] = _backtest_lr(Y, dates, splits, horizont) if modell == "LR" else _backtest_hw(Y, splits, horizont)
+        seconds[modell] = time.perf_counter() - started
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    for modell in sequential:
+        started = time.perf_counter()
+        tasks = [(modell, y, dates, splits, horizont, refit_every) for y in Y]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_connection_task, tasks, chunksize=chunksize))
+        else:
+            results = [_connection_task(task) for task in tasks]
+        forecasts[modell] = np.stack(results) if results else np.empty((0, len(splits), horizont))
+        seconds[modell] = time.perf_counter() - started
+
+    return splits, forecasts, seconds
+
+
+def horizon_table(Y, splits, forecasts):
+    # RMSE/MAPE je Modell und Horizont über alle Verbindungen und Ursprünge
+    T = Y.shape[1]
+    rows = []
+    for modell, F in forecasts.items():
+        horizont = F.shape[2]
+        actual = np.full(F.shape, np.nan)
+        for j, (_, end) in enumerate(splits):
+            k = min(horizont, T - end)
+            actual[:, j, :k] = Y[:, end:end + k]
+
+        error = F - actual
+        for h in range(horizont):
+            e, a = error[:, :, h], actual[:, :, h]
+            valid = ~np.isnan(e)
+            nonzero = valid & (a != 0)
+            rows.append({
+                "MODELL": modell,
+                "H": h + 1,
+                "RMSE": np.sqrt(np.mean(e[valid] ** 2)) if valid.any() else np.nan,
+                "MAPE": np.mean(np.abs(e[nonzero] / a[nonzero])) * 100 if nonzero.any() else np.nan,
+                "N": int(valid.sum()),
+                # Prognose fehlgeschlagen, obwohl ein Istwert vorliegt
+                "FEHLER": int((np.isnan(F[:, :, h]) & ~np.isnan(a)).sum()),
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modelle", default=",".join(MODELLE), help="Kommagetrennt, z. B. LR,HW")
+    parser.add_argument("--fenster", choices=FENSTER, default="expanding")
+    parser.add_argument("--breite", type=int, default=None, help="Fensterbreite in Monaten (sliding, Standard = --min-train)")
+    parser.add_argument("--min-train", type=int, default=24)
+    parser.add_argument("--horizont", type=int, default=12)
+    parser.add_argument("--schritt", type=int, default=1, help="Abstand der Ursprünge in Monaten")
+    parser.add_argument("--refit", type=int, default=3, help="ARIMA/SARIMA alle n Ursprünge neu schätzen (0 = nie)")
+    parser.add_argument("--workers", type=int, default=1, help="Anzahl Prozesse (0 = alle Kerne)")
+    args = parser.parse_args()
+
+    Y, dates, keys = load_series()
+    print(f"{len(Y)} Verbindungen, {len(dates)} Monate ({dates[0]:%Y-%m} bis {dates[-1]:%Y-%m})")
+
+    splits, forecasts, seconds = backtest(
+        Y, dates, modelle=args.modelle.split(","), window=args.fenster, min_train=args.min_train,
+        breite=args.breite, horizont=args.horizont, step=args.schritt,
+        workers=args.workers or None, refit_every=args.refit
+    )
+    df_horizonte = horizon_table(Y, splits, forecasts)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    df_horizonte.to_csv(ERGEBNIS_CSV, index=False)
+
+    print(f"{len(splits)} Ursprünge ({args.fenster})")
+    print(df_horizonte.pivot(index="H", columns="MODELL", values="MAPE").round(2).to_string())
+    print("Laufzeit je Modell: " + ", ".join(f"{m} {s:.1f}s" for m, s in seconds.items()))
+    print(f"✅ Ergebnisse gespeichert in {ERGEBNIS_CSV}")
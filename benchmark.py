@@ -0,0 +1,339 @@
+import io
+import os
+import json
+import time
+import string
+import logging
+import argparse
+import platform
+import warnings
+import itertools
+import importlib
+import subprocess
+import contextlib
+import tracemalloc
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+# === Benchmarks der Pipeline und der Dashboard-Callbacks ===
+# Erzeugt synthetische T100-Rohdaten in mehreren Größen (Skala 1 = etwa die
+# heutigen ~17k aggregierten Zeilen, d. h. ~473 qualifizierte Verbindungen über
+# drei Jahre) und misst je Skala:
+#   match_connections.read, connections.aggregate / aggregate_streaming,
+#   Datenvorbereitung (Kennzahlen), Holt-Winters-Auswertung (hw_batch),
+#   Laden der Dashboard-Daten, filter_routen und update_dashboard je Modell.
+# Jede Stufe läuft `--wiederholungen` Mal für die Zeit und einmal zusätzlich
+# unter tracemalloc für den Spitzenspeicher (nur Python-/NumPy-Allokationen).
+# Jeder Lauf hängt eine JSON-Zeile mit Commit, Versionen und allen Messungen an
+# bench/benchmark_ergebnisse.jsonl an, damit sich der Durchsatz über Versionen
+# vergleichen lässt. Die Daten liegen je Skala unter bench/skala_<s>/ und werden
+# wiederverwendet, solange sie existieren (`--neu` erzeugt sie neu).
+
+from match_connections import KEY_COLS
+from connections import YEAR_FILES, sum_cols
+from forecast_models import MODELLE
+
+BASIS_VERBINDUNGEN = 473
+BASIS_FLUGHAEFEN = 110
+BASIS_CARRIER = 50
+
+JAHRE = (2022, 2023, 2024)
+
+PAKET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_DIR = "bench"
+ERGEBNIS_PATH = os.path.join(BENCH_DIR, "benchmark_ergebnisse.jsonl")
+
+# Summenspalten, die beim Aufteilen einer Zeile auf zwei Zeilen geteilt werden
+_TEILBAR = ["DEPARTURES_SCHEDULED", "DEPARTURES_PERFORMED", "PAYLOAD", "SEATS", "PASSENGERS", "FREIGHT", "MAIL"]
+
+
+def airport_codes(n):
+    return np.array(["".join(c) for c in itertools.islice(itertools.product(string.ascii_uppercase, repeat=3), n)])
+
+
+def generate(directory, skala=1.0, seed=0, jahre=JAHRE):
+    # Drei Jahresdateien im Format der T100-Segmentdaten (Namen wie YEAR_FILES).
+    # Die Hälfte der Verbindungen qualifiziert sich (alle Monate, >= 100 Passagiere
+    # pro Flug); die andere Hälfte hat zu wenig Passagiere pro Flug oder Lücken.
+    # 30 % der Monatszeilen sind wie in den Rohdaten auf zwei Zeilen verteilt.
+    rng = np.random.default_rng(seed)
+    n = max(1, int(round(BASIS_VERBINDUNGEN * skala)))
+    n_alle = 2 * n
+    n_flughaefen = max(2, int(round(BASIS_FLUGHAEFEN * np.sqrt(skala))))
+    n_carrier = max(1, int(round(BASIS_CARRIER * np.sqrt(skala))))
+
+    codes = airport_codes(n_flughaefen)
+    origin = rng.integers(n_flughaefen, size=n_alle)
+    dest = (origin + rng.integers(1, n_flughaefen, size=n_alle)) % n_flughaefen
+    airline = 19000 + rng.integers(n_carrier, size=n_alle)
+
+    verbindungen = pd.DataFrame({
+        "AIRLINE_ID": airline,
+        "UNIQUE_CARRIER_ENTITY": pd.Series(airline % 10000).astype(str).str.zfill(4) + "A",
+        "ORIGIN": codes[origin],
+        "DEST": codes[dest],
+        "AIRCRAFT_TYPE": rng.integers(600, 900, size=n_alle),
+        "LEVEL": rng.lognormal(np.log(4000), 1.0, size=n_alle),
+        "PHASE": rng.uniform(0, 2 * np.pi, size=n_alle),
+        "DISTANCE": rng.integers(300, 9000, size=n_alle),
+    })
+    # Nicht qualifiziert: erste Hälfte wenig Passagiere pro Flug, zweite Hälfte Lücken
+    gut = np.arange(n_alle) < n
+    luecken = np.arange(n_alle) >= n + n // 2
+    verbindungen["LUECKEN"] = luecken
+    verbindungen["PAX_PRO_FLUG"] = np.where(gut | luecken,
+                                            rng.uniform(110, 250, size=n_alle),
+                                            rng.uniform(20, 90, size=n_alle))
+    verbindungen = verbindungen.drop_duplicates(subset=KEY_COLS).reset_index(drop=True)
+
+    os.makedirs(directory, exist_ok=True)
+    zeilen = 0
+    for jahr_nr, (jahr, path) in enumerate(zip(jahre, YEAR_FILES)):
+        k = len(verbindungen)
+        idx = np.repeat(np.arange(k), 12)
+        month = np.tile(np.arange(1, 13), k)
+        df = verbindungen.iloc[idx].reset_index(drop=True)
+        df["YEAR"] = jahr
+        df["MONTH"] = month
+
+        saison = 1 + 0.2 * np.sin(2 * np.pi * (month - 1) / 12 + df["PHASE"].to_numpy())
+        pax = np.round(df["LEVEL"].to_numpy() * (1 + 0.05 * jahr_nr) * saison * rng.lognormal(0, 0.1, size=len(df)))
+        dep = np.ceil(pax / df["PAX_PRO_FLUG"].to_numpy())
+        seats = np.ceil(pax / rng.uniform(0.6, 0.95, size=len(df)))
+
+        df["DEPARTURES_SCHEDULED"] = dep
+        df["DEPARTURES_PERFORMED"] = dep
+        df["PAYLOAD"] = seats * 100
+        df["SEATS"] = seats
+        df["PASSENGERS"] = pax
+        df["FREIGHT"] = rng.integers(0, 50000, size=len(df)).astype(float)
+        df["MAIL"] = 0.0
+        df["DISTANCE"] = df["DISTANCE"].astype(float)
+        df["RAMP_TO_RAMP"] = dep * 300
+        df["AIR_TIME"] = dep * 270
+        for col in sum_cols[10:]:
+            df[col] = 0
+        df["QUARTER"] = (month - 1) // 3 + 1
+
+        # Lücken: einzelne Monate fehlen
+        df = df[~(df["LUECKEN"].to_numpy() & (rng.random(len(df)) < 0.2))]
+
+        # Aufteilen auf zwei Zeilen
+        split = rng.random(len(df)) < 0.3
+        a = df.copy()
+        b = df[split].copy()
+        half = np.floor(a.loc[split, _TEILBAR] / 2)
+        b[_TEILBAR] = a.loc[split, _TEILBAR].to_numpy() - half.to_numpy()
+        a.loc[split, _TEILBAR] = half
+
+        out = pd.concat([a, b]).sample(frac=1, random_state=seed + jahr)
+        out = out[KEY_COLS + ["YEAR", "MONTH"] + sum_cols]
+        out.to_csv(os.path.join(directory, path), index=False, float_format="%.2f")
+        zeilen += len(out)
+
+    return zeilen
+
+
+@contextlib.contextmanager
+def _still():
+    # Ausgaben und Warnungen der gemessenen Funktionen unterdrücken
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+def measure(func, wiederholungen=3, speicher=True):
+    # (Ergebnis, Sekunden je Wiederholung, Spitzenspeicher in MB oder None)
+    sekunden = []
+    result = None
+    for _ in range(wiederholungen):
+        started = time.perf_counter()
+        with _still():
+            result = func()
+        sekunden.append(time.perf_counter() - started)
+
+    peak = None
+    if speicher:
+        tracemalloc.start()
+        with _still():
+            func()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    return result, sekunden, peak
+
+
+def _eintrag(skala, stufe, sekunden, peak, einheiten=None, einheit=None):
+    median = float(np.median(sekunden))
+    eintrag = {
+        "skala": skala,
+        "stufe": stufe,
+        "sekunden": [round(s, 6) for s in sekunden],
+        "median_s": round(median, 6),
+        "min_s": round(min(sekunden), 6),
+        "speicher_peak_mb": None if peak is None else round(peak, 2),
+    }
+    if einheiten is not None:
+        eintrag.update(einheit=einheit, anzahl=int(einheiten), durchsatz_pro_s=round(einheiten / median, 2) if median > 0 else None)
+    return eintrag
+
+
+def _load_module(filename, name):
+    # Skripte mit Leerzeichen im Namen (z. B. "Holt Winter komplett.py")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PAKET_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_pipeline(skala, zeilen_roh, wiederholungen, speicher):
+    import match_connections
+    import connections
+    from datastore import read_dataset, write_dataset
+    from Datenvorbereitung import add_kennzahlen
+
+    ergebnisse = []
+
+    def stufe(name, func, einheiten=None, einheit=None):
+        result, sekunden, peak = measure(func, wiederholungen, speicher)
+        n = einheiten(result) if callable(einheiten) else einheiten
+        ergebnisse.append(_eintrag(skala, name, sekunden, peak, n, einheit))
+        print(f"  {name:<40} {np.median(sekunden):8.3f} s" + (f"  {peak:8.1f} MB" if peak is not None else ""))
+        return result
+
+    stufe("match_connections.read", lambda: match_connections.read(*YEAR_FILES), zeilen_roh, "zeilen_roh")
+    stufe("connections.aggregate", lambda: connections.aggregate(YEAR_FILES), zeilen_roh, "zeilen_roh")
+
+    def aggregieren():
+        df_agg = connections.aggregate_streaming(YEAR_FILES)
+        write_dataset(df_agg, "aggregiert")
+        return df_agg
+
+    df_agg = stufe("connections.aggregate_streaming", aggregieren, zeilen_roh, "zeilen_roh")
+
+    def kennzahlen():
+        df = add_kennzahlen(read_dataset("aggregiert"))
+        write_dataset(df, "kennzahlen")
+        return df
+
+    stufe("Datenvorbereitung", kennzahlen, len(df_agg), "zeilen_aggregiert")
+
+    hwk = _load_module("Holt Winter komplett.py", "holt_winter_komplett")
+    stufe("hw_batch.evaluate", lambda: hwk.evaluate(*hwk.load_data(), engine="batch", initialization="legacy-heuristic")[0],
+          lambda df_results: len(df_results), "verbindungen")
+
+    return ergebnisse, len(df_agg)
+
+
+def bench_dashboard(skala, modelle, wiederholungen, speicher):
+    # Dashboard-Modul einmal importieren, danach je Skala neu laden; ohne
+    # Platten-Cache, vorberechnete Prognosen und Hintergrund-Fits, damit jeder
+    # Aufruf live im Callback fittet
+    dp = importlib.import_module("dashboard_predictions")
+    dp.warte_auf_daten()
+    dp.CACHE_DIR = None
+    dp.HINTERGRUND_MODELLE = set()
+
+    ergebnisse = []
+
+    def stufe(name, func, einheiten=None, einheit=None):
+        _, sekunden, peak = measure(func, wiederholungen, speicher)
+        ergebnisse.append(_eintrag(skala, name, sekunden, peak, einheiten, einheit))
+        print(f"  {name:<40} {np.median(sekunden):8.3f} s" + (f"  {peak:8.1f} MB" if peak is not None else ""))
+
+    stufe("dashboard.lade_daten", dp.lade_daten)
+    dp.stand.prognose_store = {}
+    dp.stand.beste_modelle = {}
+    dp.stand.hierarchie = {}
+
+    stufe("dashboard.filter_routen", lambda: dp.filter_routen(5000), 1, "aufrufe")
+
+    route = dp.stand.routen_optionen[0]['value']
+    for modell in modelle:
+        for ziel in ('ALL', route):
+            def aufruf():
+                dp.stand.prognose_cache.clear()
+                return dp.update_dashboard(ziel, modell)
+            stufe(f"dashboard.update_dashboard[{modell},{'ALL' if ziel == 'ALL' else 'ROUTE'}]", aufruf, 1, "aufrufe")
+
+    return ergebnisse
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PAKET_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(skalen, modelle=MODELLE, wiederholungen=3, speicher=True, neu=False, bench_dir=BENCH_DIR, ausgabe=ERGEBNIS_PATH):
+    warnings.simplefilter("ignore")
+    logging.disable(logging.CRITICAL)
+
+    bench_dir = os.path.abspath(bench_dir)
+    ausgabe = os.path.abspath(ausgabe)
+    cwd = os.getcwd()
+
+    lauf = {
+        "zeitpunkt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "wiederholungen": wiederholungen,
+        "ergebnisse": [],
+        "daten": [],
+    }
+
+    try:
+        for skala in skalen:
+            directory = os.path.join(bench_dir, f"skala_{skala:g}")
+            if neu or not all(os.path.exists(os.path.join(directory, f)) for f in YEAR_FILES):
+                print(f"Erzeuge Daten für Skala {skala:g} ...")
+                zeilen_roh = generate(directory, skala)
+            else:
+                zeilen_roh = sum(sum(1 for _ in open(os.path.join(directory, f))) - 1 for f in YEAR_FILES)
+
+            os.chdir(directory)
+            print(f"Skala {skala:g}: {zeilen_roh} Rohzeilen")
+
+            ergebnisse, zeilen_agg = bench_pipeline(skala, zeilen_roh, wiederholungen, speicher)
+            ergebnisse += bench_dashboard(skala, modelle, wiederholungen, speicher)
+
+            lauf["ergebnisse"] += ergebnisse
+            lauf["daten"].append({"skala": skala, "zeilen_roh": zeilen_roh, "zeilen_aggregiert": zeilen_agg})
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+
+    os.makedirs(os.path.dirname(ausgabe), exist_ok=True)
+    with open(ausgabe, "a", encoding="utf-8") as f:
+        f.write(json.dumps(lauf, ensure_ascii=False) + "\n")
+
+    return lauf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skalen", default="1,10,100", help="Kommagetrennte Datengrößen relativ zu heute, z. B. 1,10")
+    parser.add_argument("--modelle", default=",".join(MODELLE), help="Modelle für update_dashboard, z. B. LR,HW")
+    parser.add_argument("--wiederholungen", type=int, default=3)
+    parser.add_argument("--ohne-speicher", action="store_true", help="Keinen tracemalloc-Durchlauf")
+    parser.add_argument("--neu", action="store_true", help="Synthetische Daten neu erzeugen")
+    parser.add_argument("--ausgabe", default=ERGEBNIS_PATH, help="JSON-Lines-Datei, je Lauf eine Zeile")
+    args = parser.parse_args()
+
+    lauf = run(
+        [float(s) for s in args.skalen.split(",")],
+        modelle=args.modelle.split(","),
+        wiederholungen=args.wiederholungen,
+        speicher=not args.ohne_speicher,
+        neu=args.neu,
+        ausgabe=args.ausgabe,
+    )
+    print(f"✅ {len(lauf['ergebnisse'])} Messungen an {args.ausgabe} angehängt.")
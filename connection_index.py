@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# === Zeilenindex je Verbindung bzw. Route ===
+# Der Frame wird einmal nach Schlüssel und Zeit sortiert. Danach liegen die
+# Zeilen eines Schlüssels zusammenhängend und nach Datum geordnet hintereinander;
+# ein Zugriff ist ein Dict-Lookup auf (start, stop) plus Slice statt einer Maske
+# über alle Zeilen.
+
+CONNECTION_KEYS = ["AIRLINE_ID", "UNIQUE_CARRIER_ENTITY", "ORIGIN", "DEST", "AIRCRAFT_TYPE"]
+ROUTE_KEYS = ["ORIGIN", "DEST"]
+
+
+class ConnectionIndex:
+
+    def __init__(self, df, keys=CONNECTION_KEYS, order=("YEAR", "MONTH"), presorted=False):
+        # order: Zeitspalten, soweit vorhanden (Rohdaten eines Jahres haben nur MONTH)
+        # presorted: df ist schon so sortiert (mit RangeIndex) und wird ohne Kopie übernommen
+        self.keys = list(keys)
+        order = [c for c in order if c in df.columns and c not in self.keys]
+        if presorted:
+            self.df = df
+        else:
+            self.df = df.sort_values(self.keys + order, kind="stable", ignore_index=True)
+        self._ranges = self._build_ranges()
+
+    def get(self, key):
+        # key: Tupel in der Reihenfolge von keys; unbekannte Schlüssel -> leerer Frame
+        bounds = self._ranges.get(tuple(key))
+        if bounds is None:
+            return self.df.iloc[:0]
+        start, stop = bounds
+        return self.df.iloc[start:stop]
+
+    def span(self, key):
+        # (start, stop) der Zeilen eines Schlüssels in df, None wenn unbekannt
+        return self._ranges.get(tuple(key))
+
+    def items(self):
+        for key, (start, stop) in self._ranges.items():
+            yield key, self.df.iloc[start:stop]
+
+    def __contains__(self, key):
+        return tuple(key) in self._ranges
+
+    def __iter__(self):
+        return iter(self._ranges)
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def _build_ranges(self):
+        n = len(self.df)
+        if n == 0:
+            return {}
+
+        # Neuer Bereich, sobald sich eine Schlüsselspalte ändert
+        change = np.zeros(n, dtype=bool)
+        change[0] = True
+        for col in self.keys:
+            values = self.df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.codes
+            values = values.to_numpy()
+            change[1:] |= values[1:] != values[:-1]
+
+        starts = np.flatnonzero(change)
+        stops = np.append(starts[1:], n)
+
+        key_values = zip(*(self.df[col].iloc[starts].tolist() for col in self.keys))
+        return {
+            key: (int(start), int(stop))
+            for key, start, stop in zip(key_values, starts, stops)
+        }
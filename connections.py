@@ -1,15 +1,14 @@
+import sys
 import pandas as pd
 
+from datastore import write_dataset
 
-df_2022 = pd.read_csv("T_T100I_SEGMENT_ALL_CARRIER_2022.csv")
-df_2023 = pd.read_csv("T_T100I_SEGMENT_ALL_CARRIER_2023.csv")
-df_2024 = pd.read_csv("T_T100I_SEGMENT_ALL_CARRIER_2024.csv")
 
-
-df_all = pd.concat([df_2022, df_2023, df_2024], ignore_index=True)
-
-
-df_passed = pd.read_csv("passed_connections.csv")
+YEAR_FILES = [
+    "T_T100I_SEGMENT_ALL_CARRIER_2022.csv",
+    "T_T100I_SEGMENT_ALL_CARRIER_2023.csv",
+    "T_T100I_SEGMENT_ALL_CARRIER_2024.csv",
+]
 
 group_cols = [
     "AIRLINE_ID",
@@ -19,13 +18,6 @@ group_cols = [
     "AIRCRAFT_TYPE"
 ]
 
-df_filtered = df_all.merge(df_passed, on=group_cols, how="inner")
-
-
-print(f"✅ Gefiltert: {len(df_filtered)} Zeilen in df_filtered.")
-
-#df_filtered.to_csv("gefilterte_verbindungen.csv", index=False)
-
 # Schritt 1: Definiere Gruppierungsspalten
 agg_group_cols = [
     "AIRLINE_ID",
@@ -37,16 +29,121 @@ agg_group_cols = [
     "MONTH"
 ]
 
-# Schritt 2: Wähle nur echte numerische Spalten für Aggregation
-numeric_cols = df_filtered.select_dtypes(include=['number']).columns.tolist()
+# Numerische Spalten der T100-Segmentdaten (Reihenfolge wie im Rohdatensatz)
+sum_cols = [
+    "DEPARTURES_SCHEDULED",
+    "DEPARTURES_PERFORMED",
+    "PAYLOAD",
+    "SEATS",
+    "PASSENGERS",
+    "FREIGHT",
+    "MAIL",
+    "DISTANCE",
+    "RAMP_TO_RAMP",
+    "AIR_TIME",
+    "CARRIER_GROUP",
+    "CARRIER_GROUP_NEW",
+    "ORIGIN_AIRPORT_ID",
+    "ORIGIN_AIRPORT_SEQ_ID",
+    "ORIGIN_CITY_MARKET_ID",
+    "ORIGIN_WAC",
+    "DEST_AIRPORT_ID",
+    "DEST_AIRPORT_SEQ_ID",
+    "DEST_CITY_MARKET_ID",
+    "DEST_WAC",
+    "AIRCRAFT_GROUP",
+    "AIRCRAFT_CONFIG",
+    "QUARTER",
+    "DISTANCE_GROUP"
+]
+
+# Kompakte Typen fuer die Schluesselspalten beim Streaming
+key_dtypes = {
+    "AIRLINE_ID": "int32",
+    "UNIQUE_CARRIER_ENTITY": str,
+    "ORIGIN": str,
+    "DEST": str,
+    "AIRCRAFT_TYPE": "int16",
+    "YEAR": "int16",
+    "MONTH": "int8"
+}
+
+
+def read_passed(passed_csv="passed_connections.csv"):
+    return pd.read_csv(passed_csv, dtype={"UNIQUE_CARRIER_ENTITY": str})
+
+
+def aggregate(files=YEAR_FILES, passed_csv="passed_connections.csv"):
+    df_all = pd.concat([pd.read_csv(f, dtype={"UNIQUE_CARRIER_ENTITY": str}) for f in files], ignore_index=True)
+
+    df_passed = read_passed(passed_csv)
+
+    df_filtered = df_all.merge(df_passed, on=group_cols, how="inner")
+
+    print(f"✅ Gefiltert: {len(df_filtered)} Zeilen in df_filtered.")
+
+    #df_filtered.to_csv("gefilterte_verbindungen.csv", index=False)
+
+    # Schritt 2: Wähle nur echte numerische Spalten für Aggregation
+    numeric_cols = df_filtered.select_dtypes(include=['number']).columns.tolist()
+
+    # Schritt 3: Entferne alle Spalten, die zum Gruppieren genutzt werden (besonders AIRCRAFT_TYPE, YEAR, MONTH)
+    numeric_cols = [col for col in numeric_cols if col not in agg_group_cols]
+
+    # Schritt 4: Jetzt sicher aggregieren
+    return df_filtered.groupby(agg_group_cols)[numeric_cols].sum().reset_index()
+
+
+def aggregate_streaming(files=YEAR_FILES, passed_csv="passed_connections.csv", chunksize=250_000):
+    # Jedes Jahr wird in Bloecken gelesen, gegen die relevanten Verbindungen
+    # gefiltert (Semi-Join) und in eine laufende Summe je Gruppe eingefaltet.
+    # Der Speicherbedarf haengt damit nur von der Anzahl Gruppen ab.
+    df_passed = read_passed(passed_csv).astype({c: key_dtypes[c] for c in group_cols})
+
+    total = None
+    n_rows = 0
+    # Spalten, die in irgendeinem Block als float gelesen wurden (wie bei pd.concat)
+    float_cols = set()
+
+    for path in files:
+        reader = pd.read_csv(
+            path,
+            usecols=agg_group_cols + sum_cols,
+            dtype=key_dtypes,
+            chunksize=chunksize
+        )
+        for chunk in reader:
+            float_cols.update(c for c in sum_cols if chunk[c].dtype.kind == "f")
+
+            chunk = chunk.merge(df_passed, on=group_cols, how="inner")
+            if chunk.empty:
+                continue
+            n_rows += len(chunk)
+
+            part = chunk.groupby(agg_group_cols)[sum_cols].sum().astype("float64")
+            total = part if total is None else total.add(part, fill_value=0.0)
+
+    print(f"✅ Gefiltert: {n_rows} Zeilen (Streaming).")
+
+    if total is None:
+        return pd.DataFrame(columns=agg_group_cols + sum_cols)
+
+    # Summen sind ganzzahlig und damit in float64 exakt; Spalten, die nie
+    # float waren, bekommen wieder ihren Integer-Typ
+    total = total.sort_index()
+    int_cols = [c for c in sum_cols if c not in float_cols]
+    total[int_cols] = total[int_cols].astype("int64")
+
+    return total.reset_index()
 
-# Schritt 3: Entferne alle Spalten, die zum Gruppieren genutzt werden (besonders AIRCRAFT_TYPE, YEAR, MONTH)
-numeric_cols = [col for col in numeric_cols if col not in agg_group_cols]
 
-# Schritt 4: Jetzt sicher aggregieren
-df_aggregated = df_filtered.groupby(agg_group_cols)[numeric_cols].sum().reset_index()
+if __name__ == "__main__":
+    if "--stream" in sys.argv:
+        df_aggregated = aggregate_streaming(YEAR_FILES)
+    else:
+        df_aggregated = aggregate(YEAR_FILES)
 
-# Schritt 5: Ergebnis speichern oder anzeigen
-df_aggregated.to_csv("aggregierte_verbindungen.csv", index=False)
+    # Schritt 5: Ergebnis speichern oder anzeigen
+    write_dataset(df_aggregated, "aggregiert")
 
-print(f"✅ Aggregation abgeschlossen: {len(df_aggregated)} Zeilen im Ergebnis.")
\ No newline at end of file
+    print(f"✅ Aggregation abgeschlossen: {len(df_aggregated)} Zeilen im Ergebnis.")
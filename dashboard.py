@@ -6,12 +6,23 @@ from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import numpy as np
 
-# Daten laden
-df = pd.read_csv("verbindungen_mit_kennzahlen.csv")
+from datastore import read_dataset
+from route_index import build_route_index, route_options, count_above, route_stats
+from connection_index import ConnectionIndex, ROUTE_KEYS
+
+# Daten laden (nur benötigte Spalten)
+df = read_dataset("kennzahlen", columns=['ORIGIN', 'DEST', 'YEAR', 'MONTH', 'PASSENGERS', 'AUSLASTUNG'])
 
 # Datum erzeugen
 df['DATE'] = pd.to_datetime(df[['YEAR', 'MONTH']].assign(DAY=1))
 
+# Routenübersicht einmal vorberechnen
+routen_index = build_route_index(df)
+routen_optionen = route_options(routen_index)
+
+# Zeilen je Route zusammenhängend und nach Datum sortiert
+routen_zeilen = ConnectionIndex(df, ROUTE_KEYS)
+
 # App initialisieren
 app = dash.Dash(__name__)
 app.title = "Flugauslastung Dashboard"
@@ -54,15 +65,8 @@ app.layout = html.Div([
     Input('passagier-filter', 'value')
 )
 def filter_routen(min_passagiere):
-    grouped = df.groupby(['ORIGIN', 'DEST'])
-    routen = []
-
-    for (origin, dest), gruppe in grouped:
-        avg_pax = gruppe['PASSENGERS'].mean()
-        if avg_pax >= min_passagiere:
-            label = f"{origin} → {dest}"
-            value = f"{origin}_{dest}"
-            routen.append({'label': label, 'value': value})
+    # Routen sind nach ⌀ Passagieren sortiert -> Slice statt groupby
+    routen = routen_optionen[:count_above(routen_index, min_passagiere)]
 
     if not routen:
         return [], None
@@ -82,19 +86,19 @@ def update_dashboard(route):
 
     origin, dest = route.split("_")
 
-    dff = df[(df['ORIGIN'] == origin) & (df['DEST'] == dest)].copy()
-    dff = dff.sort_values('DATE')
+    dff = routen_zeilen.get((origin, dest)).copy()
 
     # Zeitreihe
     fig = px.line(dff, x='DATE', y='PASSENGERS', title=f'Passagierzahlen: {origin} → {dest}')
 
-    # Statistiken
+    # Statistiken (aus der Routenübersicht)
+    stats = route_stats(routen_index, origin, dest)
     stats_table = html.Table([
         html.Tr([html.Th("Metrik"), html.Th("Wert")]),
-        html.Tr([html.Td("⌀ Passagiere"), html.Td(f"{dff['PASSENGERS'].mean():,.0f}")]),
-        html.Tr([html.Td("⌀ Auslastung (%)"), html.Td(f"{dff['AUSLASTUNG'].mean() * 100:.2f}%")]),
-        html.Tr([html.Td("Min/Max Passagiere"), html.Td(f"{dff['PASSENGERS'].min():,.0f} / {dff['PASSENGERS'].max():,.0f}")]),
-        html.Tr([html.Td("Standardabweichung"), html.Td(f"{dff['PASSENGERS'].std():,.0f}")]),
+        html.Tr([html.Td("⌀ Passagiere"), html.Td(f"{stats['AVG_PAX']:,.0f}")]),
+        html.Tr([html.Td("⌀ Auslastung (%)"), html.Td(f"{stats['AVG_AUSLASTUNG'] * 100:.2f}%")]),
+        html.Tr([html.Td("Min/Max Passagiere"), html.Td(f"{stats['MIN_PAX']:,.0f} / {stats['MAX_PAX']:,.0f}")]),
+        html.Tr([html.Td("Standardabweichung"), html.Td(f"{stats['STD_PAX']:,.0f}")]),
     ])
 
     # Regressionsmodell
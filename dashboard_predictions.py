@@ -1,22 +1,218 @@
+import time
+_start = time.perf_counter()
+
+import threading
+
 import pandas as pd
 import dash
-from dash import dcc, html, Input, Output
-import plotly.express as px
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import flask
+from dash import dcc, html, Input, Output, Patch
 import numpy as np
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from prophet import Prophet
 
-# Daten laden
-df = pd.read_csv("verbindungen_mit_kennzahlen.csv")
-df['DATE'] = pd.to_datetime(df[['YEAR', 'MONTH']].assign(DAY=1))
+from datastore import dataset_version
+from route_index import build_route_index, route_options, count_above, route_stats
+from forecast_models import fit_forecast, metrics, route_series, actual_values, FUTURE_DATES
+from forecast_cache import ForecastCache
+from precompute_forecasts import load_store
+from model_tournament import load_winners
+from hierarchy import load_hierarchy
+from instrumentation import Metriken, Aufruf, json_log
+from figures import history_figure, forecast_trace, annotations
+from shared_dataset import build_frame, load_shared, current_version
+from metric_cube import cube_for
+from fit_queue import FitQueue
+
+# Prognose-Cache; CACHE_DIR = None -> nur im Speicher
+CACHE_DIR = "cache/prognosen"
+CACHE_SIZE = 256
+# Höchstzahl der Prognosedateien unter CACHE_DIR je Datenversion
+CACHE_DATEIEN = 4096
+
+# True -> Daten werden in einem Hintergrund-Thread geladen, die App ist sofort
+# erreichbar und die ersten Callbacks warten, bis die Daten da sind
+DATEN_IM_HINTERGRUND = True
+
+# True -> mehrere Worker-Prozesse (z. B. gunicorn dashboard_predictions:server)
+# teilen sich ein per mmap abgebildetes Segment (shared_dataset.py) statt je
+# eine eigene Kopie zu laden. Ein neu veröffentlichtes Segment wird spätestens
+# nach SEGMENT_PRUEFEN_S Sekunden übernommen.
+GEMEINSAMES_SEGMENT = False
+SEGMENT_PRUEFEN_S = 5
+
+# Diese Modelle werden im Hintergrund gefittet (FIT_WORKERS Threads); das
+# Diagramm zeigt sofort die Historie, die Prognose folgt per Polling.
+# Leere Menge -> alle Fits wie bisher direkt im Callback.
+HINTERGRUND_MODELLE = {'ARIMA', 'SARIMA', 'PROPHET'}
+FIT_WORKERS = 2
+POLL_MS = 1000
+
+# Strukturiertes Log der Callback-Zeiten (eine JSON-Zeile je Aufruf); None -> aus.
+# Zähler und Zeiten gibt es unabhängig davon unter /metriken.
+METRIK_LOG = "logs/dashboard_metriken.jsonl"
+
+# Startzeiten je Abschnitt in Sekunden
+startzeiten = {'Imports': time.perf_counter() - _start}
+
+
+class DatenStand:
+    # Alles, was zu einer Datenversion gehört. lade_daten baut einen neuen Stand
+    # vollständig auf und veröffentlicht ihn mit einer Zuweisung; ein Callback
+    # liest den Stand einmal und sieht durchgehend dieselbe Version.
+
+    def __init__(self, version):
+        self.version = version
+        self.wuerfel = None
+        self.prognose_cache = None
+        self.fit_warteschlange = None
+        self.prognose_store = {}
+        self.beste_modelle = {}
+        self.hierarchie = {}
+        self.routen_index = None
+        self.routen_optionen = []
+        self.gesamt_stats = None
+
+
+stand = None
+
+metriken = Metriken()
+if METRIK_LOG is not None:
+    json_log(METRIK_LOG)
+
+_daten_bereit = threading.Event()
+_daten_fehler = None
+
+_segment_lock = threading.Lock()
+_segment_geprueft = 0.0
+_segment_gesehen = None
+
+
+def _abschnitt(name, started):
+    startzeiten[name] = time.perf_counter() - started
+    return time.perf_counter()
+
+
+def monats_stats(monatlich):
+    return pd.Series({
+        'AVG_PAX': monatlich.mean(),
+        'MIN_PAX': monatlich.min(),
+        'MAX_PAX': monatlich.max(),
+        'STD_PAX': monatlich.std(),
+    })
+
+
+def lade_daten():
+    global stand, _daten_fehler, _segment_gesehen
+
+    try:
+        t = time.perf_counter()
+
+        # Daten laden (nur benötigte Spalten, schon nach Route und Datum sortiert)
+        if GEMEINSAMES_SEGMENT:
+            daten, version = load_shared()
+        else:
+            version = dataset_version("kennzahlen")
+            daten = build_frame()
+        neu = DatenStand(version)
+        t = _abschnitt('Daten laden', t)
+
+        # Routenübersicht und Kennzahlen für 'Alle Flüge' einmal vorberechnen
+        neu.routen_index = build_route_index(daten)
+        neu.routen_optionen = route_options(neu.routen_index)
+        t = _abschnitt('Routenindex', t)
+
+        # Monatsreihen aller Knoten aus dem Würfel (metric_cube.py), per mmap
+        # unter daten/wuerfel/, beim ersten Start der Datenversion gebaut
+        neu.wuerfel = cube_for(version)
+        neu.gesamt_stats = monats_stats(neu.wuerfel.series('ALL', only_present=True))
+        t = _abschnitt('Würfel', t)
+
+        neu.prognose_cache = ForecastCache(version, maxsize=CACHE_SIZE, cache_dir=CACHE_DIR, disk_maxsize=CACHE_DATEIEN)
+        neu.fit_warteschlange = FitQueue(neu.prognose_cache, workers=FIT_WORKERS, metriken=metriken)
+        # Offline vorberechnete Prognosen (precompute_forecasts.py), nur bei passender Datenversion
+        neu.prognose_store = load_store(version)
+        # Gewinner der Modellauswahl (model_tournament.py) für 'Bestes Modell'
+        neu.beste_modelle = load_winners(version)
+        # Abgestimmte Prognosen je Knoten (hierarchy.py) für 'Hierarchisch'
+        neu.hierarchie = load_hierarchy(version)
+        _abschnitt('Prognosen/Cache', t)
+
+        alt, stand = stand, neu
+        if alt is not None:
+            alt.fit_warteschlange.shutdown()
+    except Exception as e:
+        if stand is None:
+            # Erster Start: ohne Daten kann kein Callback antworten
+            _daten_fehler = e
+            print("Fehler beim Laden der Daten:", e)
+        else:
+            # Neuladen: bisheriger Stand bleibt gültig, beim nächsten
+            # _pruefe_segment wird die neue Version erneut versucht
+            with _segment_lock:
+                _segment_gesehen = None
+            print(f"Fehler beim Neuladen der Daten, Version {stand.version} bleibt aktiv:", e)
+    finally:
+        if not _daten_bereit.is_set():
+            startzeiten['Gesamt bis Daten bereit'] = time.perf_counter() - _start
+            _daten_bereit.set()
+            print("Startzeiten: " + ", ".join(f"{name} {sek:.2f}s" for name, sek in startzeiten.items()))
+
+
+def warte_auf_daten():
+    # Callbacks blockieren beim ersten Aufruf, bis lade_daten fertig ist;
+    # Rückgabe: der aktuelle DatenStand
+    _daten_bereit.wait()
+    if _daten_fehler is not None:
+        raise RuntimeError(f"Daten konnten nicht geladen werden: {_daten_fehler}")
+    if GEMEINSAMES_SEGMENT:
+        _pruefe_segment()
+    return stand
+
+
+def _pruefe_segment():
+    # Höchstens alle SEGMENT_PRUEFEN_S Sekunden den Zeiger lesen; wurde eine neue
+    # Version veröffentlicht, im Hintergrund neu laden. Bis dahin antworten die
+    # Callbacks mit dem alten Segment, das abgebildet bleibt.
+    global _segment_geprueft, _segment_gesehen
+
+    jetzt = time.monotonic()
+    with _segment_lock:
+        if jetzt - _segment_geprueft < SEGMENT_PRUEFEN_S:
+            return
+        _segment_geprueft = jetzt
+        version = current_version()
+        if version is None or version in (stand.version, _segment_gesehen):
+            return
+        _segment_gesehen = version
+
+    threading.Thread(target=lade_daten, name="daten-neu-laden", daemon=True).start()
+
+
+if DATEN_IM_HINTERGRUND:
+    threading.Thread(target=lade_daten, name="daten-laden", daemon=True).start()
+else:
+    lade_daten()
 
 # App initialisieren
 app = dash.Dash(__name__)
 app.title = "Flugauslastung Dashboard"
+# WSGI-Einstiegspunkt für mehrere Worker
+server = app.server
+startzeiten['App'] = time.perf_counter() - _start - startzeiten['Imports']
+
+
+@app.server.route('/metriken')
+def metriken_endpunkt():
+    # Zähler und Zeiten seit dem Start als JSON
+    daten = metriken.snapshot()
+    daten['startzeiten'] = {name: round(sek, 3) for name, sek in startzeiten.items()}
+    aktuell = stand
+    if aktuell is not None:
+        cache, warteschlange = aktuell.prognose_cache, aktuell.fit_warteschlange
+        daten['version'] = aktuell.version
+        daten['cache'] = {'treffer': cache.hits, 'fehlschlaege': cache.misses, 'eintraege': len(cache)}
+        daten['hintergrund'] = {'laufend': len(warteschlange), 'gestartet': warteschlange.submitted, 'zusammengefasst': warteschlange.coalesced}
+        daten['store'] = {'prognosen': len(aktuell.prognose_store), 'beste_modelle': len(aktuell.beste_modelle), 'hierarchie': len(aktuell.hierarchie)}
+    return flask.jsonify(daten)
 
 # Layout
 app.layout = html.Div([
@@ -49,13 +245,17 @@ app.layout = html.Div([
                 {'label': 'Holt-Winters', 'value': 'HW'},
                 {'label': 'ARIMA', 'value': 'ARIMA'},
                 {'label': 'SARIMA', 'value': 'SARIMA'},
-                {'label': 'Prophet', 'value': 'PROPHET'}
+                {'label': 'Prophet', 'value': 'PROPHET'},
+                {'label': 'Bestes Modell (vorberechnet)', 'value': 'BEST'},
+                {'label': 'Hierarchisch abgestimmt (vorberechnet)', 'value': 'HIER'}
             ],
             value='LR'
         )
     ], style={'width': '45%', 'display': 'inline-block', 'marginLeft': '5%'}),
 
     dcc.Graph(id='zeitreihe'),
+    # Fragt nach, solange eine Prognose im Hintergrund berechnet wird
+    dcc.Interval(id='prognose-poll', interval=POLL_MS, disabled=True),
 
     html.H3("Auslastung & Statistiken"),
     html.Div(id='statistik-output'),
@@ -70,122 +270,180 @@ app.layout = html.Div([
     Input('passagier-filter', 'value')
 )
 def filter_routen(min_passagiere):
-    grouped = df.groupby(['ORIGIN', 'DEST'])
-    routen = [{'label': 'Alle Flüge', 'value': 'ALL'}]
+    aktuell = warte_auf_daten()
 
-    for (origin, dest), gruppe in grouped:
-        avg_pax = gruppe['PASSENGERS'].mean()
-        if avg_pax >= min_passagiere:
-            label = f"{origin} → {dest}"
-            value = f"{origin}_{dest}"
-            routen.append({'label': label, 'value': value})
+    with metriken.messen('callback', callback='filter_routen'):
+        # Routen sind nach ⌀ Passagieren sortiert -> Slice statt groupby
+        routen = aktuell.routen_optionen[:count_above(aktuell.routen_index, min_passagiere)]
+        # Abflughäfen der angezeigten Routen, in Reihenfolge ihrer größten Route
+        flughaefen = [
+            {'label': f"Ab {origin} (alle Ziele)", 'value': f"AB:{origin}"}
+            for origin in dict.fromkeys(option['value'].split("_")[0] for option in routen)
+        ]
+        routen = [{'label': 'Alle Flüge', 'value': 'ALL'}] + flughaefen + routen
 
     return routen, routen[0]['value']
 
+
+def _ausloeser():
+    # ID des auslösenden Inputs; None außerhalb eines Dash-Callbacks (z. B. Benchmarks)
+    try:
+        return dash.ctx.triggered_id
+    except dash.exceptions.MissingCallbackContextException:
+        return None
+
+
 @app.callback(
     Output('zeitreihe', 'figure'),
     Output('statistik-output', 'children'),
     Output('metriken-output', 'children'),
+    Output('prognose-poll', 'disabled'),
     Input('route-select', 'value'),
-    Input('modell-select', 'value')
+    Input('modell-select', 'value'),
+    Input('prognose-poll', 'n_intervals')
 )
-def update_dashboard(route, modell):
+def update_dashboard(route, modell, _poll=None):
     if not route:
-        return {}, "", ""
+        return {}, "", "", True
+
+    aktuell = warte_auf_daten()
+    wuerfel, prognose_cache, fit_warteschlange = aktuell.wuerfel, aktuell.prognose_cache, aktuell.fit_warteschlange
+
+    ausloeser = _ausloeser()
+    # Polling, Fit läuft noch: nichts ändern
+    if ausloeser == 'prognose-poll' and fit_warteschlange.running(route, modell):
+        return dash.no_update, dash.no_update, dash.no_update, False
 
     if route == 'ALL':
-        df_agg = df.groupby('DATE')['PASSENGERS'].sum().reset_index()
-        df_agg['ORIGIN'] = 'ALL'
-        df_agg['DEST'] = 'ALL'
-        dff = df_agg
-        title = 'Passagierzahlen: Alle Flüge'
+        ebene = 'ALL'
+    elif route.startswith('AB:'):
+        ebene = 'FLUGHAFEN'
     else:
-        origin, dest = route.split("_")
-        dff = df[(df['ORIGIN'] == origin) & (df['DEST'] == dest)].copy()
-        title = f'Passagierzahlen: {origin} → {dest}'
+        ebene = 'ROUTE'
 
-    dff = dff.sort_values('DATE')
+    # Nur das Modell hat sich geändert oder ein Hintergrund-Fit ist fertig:
+    # Historie und Statistik stehen schon im Browser, es wird nur die Prognose
+    # (Trace 1) per Patch ausgetauscht
+    nur_prognose = ausloeser in ('modell-select', 'prognose-poll')
 
-    all_dates = pd.date_range(start=dff['DATE'].min(), end=dff['DATE'].max(), freq='MS')
-    dff = dff.set_index('DATE').reindex(all_dates).fillna(0.0).rename_axis('DATE').reset_index()
+    with Aufruf(metriken, 'update_dashboard', modell=modell, ebene=ebene) as aufruf:
+        aufruf.info['route'] = route
+        aufruf.info['teilweise'] = nur_prognose
 
-    # Zeitreihe
-    fig = px.line(dff, x='DATE', y='PASSENGERS', title=title)
+        dff = None
+        if not nur_prognose:
+            with aufruf.stufe('daten'):
+                if route == 'ALL':
+                    title = 'Passagierzahlen: Alle Flüge'
+                    stats = aktuell.gesamt_stats
+                elif route.startswith('AB:'):
+                    title = f'Passagierzahlen: alle Flüge ab {route[3:]}'
+                    stats = None
+                else:
+                    origin, dest = route.split("_")
+                    title = f'Passagierzahlen: {origin} → {dest}'
+                    stats = route_stats(aktuell.routen_index, origin, dest)
 
-    stats_table = html.Table([
-        html.Tr([html.Th("Metrik"), html.Th("Wert")]),
-        html.Tr([html.Td("⌀ Passagiere"), html.Td(f"{dff['PASSENGERS'].mean():,.0f}")]),
-        html.Tr([html.Td("Min/Max Passagiere"), html.Td(f"{dff['PASSENGERS'].min():,.0f} / {dff['PASSENGERS'].max():,.0f}")]),
-        html.Tr([html.Td("Standardabweichung"), html.Td(f"{dff['PASSENGERS'].std():,.0f}")]),
-    ])
+                dff = route_series(wuerfel, route)
+                if stats is None:
+                    stats = monats_stats(dff['PASSENGERS'])
 
-    future_dates = pd.date_range(start='2024-01-01', end='2024-12-01', freq='MS')
-    y_true_2024 = df[df['DATE'].between('2024-01-01', '2024-12-31')]
-    if route == 'ALL':
-        y_true_2024 = y_true_2024.groupby('DATE')['PASSENGERS'].sum()
-    else:
-        y_true_2024 = y_true_2024[(df['ORIGIN'] == origin) & (df['DEST'] == dest)].set_index('DATE')['PASSENGERS']
+            with aufruf.stufe('tabellen'):
+                stats_table = html.Table([
+                    html.Tr([html.Th("Metrik"), html.Th("Wert")]),
+                    html.Tr([html.Td("⌀ Passagiere"), html.Td(f"{stats['AVG_PAX']:,.0f}")]),
+                    html.Tr([html.Td("Min/Max Passagiere"), html.Td(f"{stats['MIN_PAX']:,.0f} / {stats['MAX_PAX']:,.0f}")]),
+                    html.Tr([html.Td("Standardabweichung"), html.Td(f"{stats['STD_PAX']:,.0f}")]),
+                ])
 
-    forecast = []
-    y_pred = []
-    mae = rmse = r2 = None
+        future_dates = FUTURE_DATES
 
-    try:
-        if modell == 'LR':
-            dff['timestamp'] = (dff['DATE'] - dff['DATE'].min()).dt.days
-            X = dff[['timestamp']]
-            y = dff['PASSENGERS']
-            model = LinearRegression().fit(X, y)
-            future_X = (future_dates - dff['DATE'].min()).days.values.reshape(-1, 1)
-            y_pred = model.predict(X)
-            forecast = model.predict(future_X)
-
-        elif modell == 'HW':
-            model = ExponentialSmoothing(dff['PASSENGERS'], trend='add', seasonal='add', seasonal_periods=12)
-            model_fit = model.fit()
-            y_pred = model_fit.fittedvalues
-            forecast = model_fit.forecast(12)
-
-        elif modell == 'ARIMA':
-            model = ARIMA(dff['PASSENGERS'], order=(1, 1, 1))
-            model_fit = model.fit()
-            y_pred = model_fit.predict(start=1, end=len(dff)-1, typ="levels")
-            forecast = model_fit.forecast(12)
-
-        elif modell == 'SARIMA':
-            model = SARIMAX(dff['PASSENGERS'], order=(1,1,1), seasonal_order=(1,1,1,12))
-            model_fit = model.fit(disp=False)
-            y_pred = model_fit.fittedvalues
-            forecast = model_fit.forecast(12)
-
-        elif modell == 'PROPHET':
-            prophet_df = dff[['DATE', 'PASSENGERS']].rename(columns={'DATE': 'ds', 'PASSENGERS': 'y'})
-            model = Prophet()
-            model.fit(prophet_df)
-            future_df = pd.DataFrame({'ds': future_dates})
-            forecast_df = model.predict(future_df)
-            forecast = forecast_df['yhat'].values
-            y_pred = model.predict(prophet_df)['yhat']
-
-        # Prognose zeichnen
-        fig.add_scatter(x=future_dates, y=forecast, name='Prognose 2024', mode='lines', line=dict(dash='dash'))
-
-        # Metriken berechnen
-        mae = mean_absolute_error(y_true_2024, forecast)
-        rmse = np.sqrt(mean_squared_error(y_true_2024, forecast))
-        r2 = r2_score(y_true_2024, forecast)
+        mae = rmse = r2 = None
 
-    except Exception as e:
-        print("Fehler bei Prognose:", e)
+        prognose_name = 'Prognose 2024'
+        prognose = forecast_trace(name=prognose_name)
+        hinweis = None
+        quelle = 'store'
+
+        try:
+            with aufruf.stufe('nachschlagen'):
+                if modell == 'BEST':
+                    # Nur vorberechnet; ohne Turnierergebnis keine Prognose
+                    entry = aktuell.beste_modelle.get(route)
+                    if entry is None:
+                        raise LookupError(f"kein Turnierergebnis für {route} (model_tournament.py laufen lassen)")
+                    prognose_name = f"Prognose 2024 ({entry['modell']})"
+                elif modell == 'HIER':
+                    # Knoten der Hierarchie, kohärent zu den Verbindungsprognosen
+                    entry = aktuell.hierarchie.get(route)
+                    if entry is None:
+                        raise LookupError(f"{route} nicht in der Hierarchie (hierarchy.py laufen lassen)")
+                    prognose_name = 'Prognose 2024 (hierarchisch)'
+                else:
+                    # Vorberechnete Prognosen zuerst, dann Cache, sonst live fitten
+                    entry = aktuell.prognose_store.get((route, modell))
+                if entry is None:
+                    quelle = 'cache'
+                    entry = prognose_cache.get(route, modell)
+            if entry is None:
+                # Hintergrund-Fit für diese Datenversion schon fehlgeschlagen -> nicht erneut starten
+                fehler = fit_warteschlange.error(route, modell)
+                if fehler is not None:
+                    raise RuntimeError(fehler)
+            if entry is None:
+                if dff is None:
+                    with aufruf.stufe('daten'):
+                        dff = route_series(wuerfel, route)
+                with aufruf.stufe('istwerte'):
+                    y_true_2024 = actual_values(wuerfel, route, future_dates)
+
+            if entry is None and modell in HINTERGRUND_MODELLE:
+                quelle = 'hintergrund'
+                with aufruf.stufe('einreihen'):
+                    fit_warteschlange.submit(route, modell, dff, future_dates, y_true_2024)
+                hinweis = f"Prognose ({modell}) wird berechnet …"
+            elif entry is None:
+                quelle = 'fit'
+                with aufruf.stufe('fit'):
+                    forecast, y_pred = fit_forecast(modell, dff, future_dates)
+                with aufruf.stufe('metriken'):
+                    mae, rmse, r2 = metrics(y_true_2024, forecast)
+                entry = {'forecast': forecast, 'fitted': y_pred, 'mae': mae, 'rmse': rmse, 'r2': r2}
+                prognose_cache.put(route, modell, entry)
+
+            if entry is not None:
+                # Prognose zeichnen
+                with aufruf.stufe('figur'):
+                    prognose = forecast_trace(future_dates, entry['forecast'], name=prognose_name)
+
+                mae, rmse, r2 = entry['mae'], entry['rmse'], entry['r2']
+
+        except Exception as e:
+            quelle = 'fehler'
+            print("Fehler bei Prognose:", e)
+
+        aufruf.info['quelle'] = quelle
+        metriken.zaehlen('prognose_quelle', modell=modell, quelle=quelle)
+
+        with aufruf.stufe('figur'):
+            if nur_prognose:
+                fig = Patch()
+                fig['data'][1] = prognose
+                fig['layout']['annotations'] = annotations(hinweis)
+                stats_table = dash.no_update
+            else:
+                fig = history_figure(dff['DATE'], dff['PASSENGERS'], title, prognose, hinweis)
 
-    metriken_table = html.Table([
-        html.Tr([html.Th("Metrik"), html.Th("Wert")]),
-        html.Tr([html.Td("MAE"), html.Td(f"{mae:.2f}" if mae else "-")]),
-        html.Tr([html.Td("RMSE"), html.Td(f"{rmse:.2f}" if rmse else "-")]),
-        html.Tr([html.Td("R²"), html.Td(f"{r2:.2f}" if r2 else "-")]),
-    ])
+        with aufruf.stufe('tabellen'):
+            metriken_table = html.Table([
+                html.Tr([html.Th("Metrik"), html.Th("Wert")]),
+                html.Tr([html.Td("MAE"), html.Td(f"{mae:.2f}" if mae else "-")]),
+                html.Tr([html.Td("RMSE"), html.Td(f"{rmse:.2f}" if rmse else "-")]),
+                html.Tr([html.Td("R²"), html.Td(f"{r2:.2f}" if r2 else "-")]),
+            ] if hinweis is None else [html.Tr([html.Td(hinweis)])])
 
-    return fig, stats_table, metriken_table
+    # Polling nur, solange ein Hintergrund-Fit aussteht
+    return fig, stats_table, metriken_table, hinweis is None
 
 if __name__ == '__main__':
     app.run(debug=True)
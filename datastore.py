@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+# === Spaltenbasierte Ablage der Verbindungsdaten ===
+# Jeder Datensatz liegt als Parquet-Verzeichnis unter daten/<name>/, partitioniert
+# nach YEAR und MONTH (daten/kennzahlen/YEAR=2024/MONTH=3/...). Verbraucher laden
+# nur die Spalten und Partitionen, die sie brauchen. Solange noch kein Parquet-
+# Datensatz geschrieben wurde, wird auf die bisherigen CSV-Dateien zurückgegriffen.
+
+DATA_DIR = "daten"
+
+# Zeilen kommen nach YEAR/MONTH sortiert zurück, innerhalb eines Monats in
+# der geschriebenen Reihenfolge (bei CSV und Parquet gleich)
+PARTITION_COLS = ["YEAR", "MONTH"]
+
+CSV_FILES = {
+    "aggregiert": "aggregierte_verbindungen.csv",
+    "kennzahlen": "verbindungen_mit_kennzahlen.csv",
+}
+
+# Typschema der Verbindungsdaten: Flughafen- und Carrier-Codes als Kategorien,
+# Schlüssel, Zeit und Zählwerte als kleinste passende Ganzzahltypen. Wird beim
+# Lesen auf jeden Datensatz angewendet; Spalten außerhalb des Schemas bleiben
+# wie gespeichert. Werte, die nicht in den Zieltyp passen (Lücken,
+# Nachkommastellen, Überlauf), behalten ihren bisherigen Typ.
+SCHEMA = {
+    "AIRLINE_ID": "int32",
+    "UNIQUE_CARRIER_ENTITY": "category",
+    "ORIGIN": "category",
+    "DEST": "category",
+    "AIRCRAFT_TYPE": "int16",
+    "YEAR": "int16",
+    "MONTH": "int8",
+    "DEPARTURES_SCHEDULED": "int32",
+    "DEPARTURES_PERFORMED": "int32",
+    "SEATS": "int32",
+    "PASSENGERS": "int32",
+    "PAYLOAD": "int64",
+    "FREIGHT": "int64",
+    "MAIL": "int64",
+    "DISTANCE": "int32",
+    "RAMP_TO_RAMP": "int32",
+    "AIR_TIME": "int32",
+}
+
+# Codes schon beim Parsen der CSV als Kategorie einlesen
+_CSV_DTYPES = {col: dtype for col, dtype in SCHEMA.items() if dtype == "category"}
+
+_META_KEY = b"psba_columns"
+
+
+def dataset_path(name):
+    return os.path.join(DATA_DIR, name)
+
+
+def has_dataset(name):
+    return os.path.isdir(dataset_path(name))
+
+
+def dataset_version(name):
+    # Fingerabdruck aus Pfad, Größe und Änderungszeit aller Dateien des Datensatzes;
+    # ändert sich bei jedem neuen Schreiben
+    if has_dataset(name):
+        root = dataset_path(name)
+        files = sorted(
+            os.path.join(dirpath, f)
+            for dirpath, _, filenames in os.walk(root)
+            for f in filenames
+        )
+    else:
+        root = "."
+        files = [CSV_FILES[name]]
+
+    digest = hashlib.sha1(name.encode())
+    for path in files:
+        st = os.stat(path)
+        digest.update(f"{os.path.relpath(path, root)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def write_dataset(df, name):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Ursprüngliche Spaltenreihenfolge merken (Partitionsspalten landen beim Lesen sonst hinten)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_META_KEY] = json.dumps(list(df.columns)).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # Erst in ein temporäres Verzeichnis schreiben, dann austauschen
+    path = dataset_path(name)
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    pq.write_to_dataset(table, tmp, partition_cols=PARTITION_COLS)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def write_partitions(df, name):
+    # Nur die in df enthaltenen YEAR/MONTH-Partitionen ersetzen, alle anderen bleiben
+    # unverändert. Typen werden an den vorhandenen Datensatz angepasst, damit alle
+    # Dateien dasselbe Schema haben.
+    if not has_dataset(name):
+        if name in CSV_FILES and os.path.exists(CSV_FILES[name]):
+            # Bisher nur als CSV vorhanden: erst den vollen Bestand übernehmen,
+            # sonst bestünde der Datensatz danach nur aus den neuen Monaten
+            base = read_dataset(name)
+            if set(base.columns) != set(df.columns):
+                raise ValueError(f"Spalten passen nicht zu {CSV_FILES[name]}: {sorted(set(base.columns) ^ set(df.columns))}")
+            months = pd.MultiIndex.from_frame(df[PARTITION_COLS].drop_duplicates())
+            keep = ~pd.MultiIndex.from_frame(base[PARTITION_COLS]).isin(months)
+            df = pd.concat([base[keep], df[list(base.columns)]], ignore_index=True)
+        write_dataset(df, name)
+        return
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    stored = ds.dataset(dataset_path(name), format="parquet", partitioning="hive").schema
+    columns = json.loads(stored.metadata[_META_KEY]) if stored.metadata and _META_KEY in stored.metadata else list(df.columns)
+    if set(columns) != set(df.columns):
+        raise ValueError(f"Spalten passen nicht zu {dataset_path(name)}: {sorted(set(columns) ^ set(df.columns))}")
+
+    # Metadaten (Spaltenreihenfolge, pandas-Typen) ebenfalls vom vorhandenen Datensatz
+    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+    table = table.cast(pa.schema([stored.field(col) for col in columns], metadata=stored.metadata))
+
+    pq.write_to_dataset(
+        table,
+        dataset_path(name),
+        partition_cols=PARTITION_COLS,
+        existing_data_behavior="delete_matching"
+    )
+
+
+def dataset_partitions(name):
+    # Vorhandene (YEAR, MONTH)-Partitionen, sortiert; ohne daten/<name> die Monate der CSV
+    if not has_dataset(name):
+        if name in CSV_FILES and os.path.exists(CSV_FILES[name]):
+            months = read_dataset(name, columns=PARTITION_COLS).drop_duplicates()
+            return sorted(zip(months["YEAR"].astype(int).tolist(), months["MONTH"].astype(int).tolist()))
+        return []
+
+    partitions = []
+    root = dataset_path(name)
+    for year_dir in os.listdir(root):
+        if not year_dir.startswith("YEAR="):
+            continue
+        for month_dir in os.listdir(os.path.join(root, year_dir)):
+            if month_dir.startswith("MONTH="):
+                partitions.append((int(year_dir[5:]), int(month_dir[6:])))
+    return sorted(partitions)
+
+
+def read_dataset(name, columns=None, years=None, months=None):
+    if not has_dataset(name):
+        return _read_csv(name, columns, years, months)
+
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    dataset = ds.dataset(
+        dataset_path(name),
+        format="parquet",
+        partitioning="hive",
+        filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+    # Filter auf Partitionsspalten -> nicht benötigte Dateien werden gar nicht geöffnet
+    filt = None
+    if years is not None:
+        filt = ds.field("YEAR").isin(list(years))
+    if months is not None:
+        month_filter = ds.field("MONTH").isin(list(months))
+        filt = month_filter if filt is None else filt & month_filter
+
+    load_cols = None if columns is None else _with_partition_cols(columns)
+    df = apply_schema(dataset.to_table(columns=load_cols, filter=filt).to_pandas())
+
+    df = _sort_rows(df)
+
+    if columns is None:
+        stored = dataset.schema.metadata.get(_META_KEY) if dataset.schema.metadata else None
+        if stored:
+            df = df[json.loads(stored)]
+    else:
+        df = df[list(columns)]
+
+    return df
+
+
+def _read_csv(name, columns, years, months):
+    usecols = None if columns is None else _with_partition_cols(columns)
+
+    df = pd.read_csv(CSV_FILES[name], usecols=usecols, dtype=_CSV_DTYPES)
+    df = apply_schema(df)
+
+    if years is not None:
+        df = df[df["YEAR"].isin(list(years))]
+    if months is not None:
+        df = df[df["MONTH"].isin(list(months))]
+
+    df = _sort_rows(df)
+
+    if columns is not None:
+        df = df[list(columns)]
+
+    return df
+
+
+def apply_schema(df):
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            df[col] = _as_codes(df[col])
+        elif df[col].dtype != dtype and _fits(df[col], dtype):
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _as_codes(values):
+    # Codes immer als Text, auch wenn sie wie Zahlen aussehen (z. B. "11033"), und
+    # mit sortierten Kategorien, damit groupby wie bei Strings sortiert
+    if not isinstance(values.dtype, pd.CategoricalDtype) or values.cat.categories.dtype.kind in "iuf":
+        return values.astype(str).astype("category")
+    categories = values.cat.categories
+    if not categories.is_monotonic_increasing:
+        values = values.cat.reorder_categories(categories.sort_values())
+    return values
+
+
+def _fits(values, dtype):
+    arr = values.to_numpy()
+    if arr.dtype.kind not in "iuf":
+        return False
+    if arr.dtype.kind == "f" and not (np.isfinite(arr).all() and (arr == np.trunc(arr)).all()):
+        return False
+    if arr.size == 0:
+        return True
+    info = np.iinfo(dtype)
+    return bool(info.min <= arr.min() and arr.max() <= info.max)
+
+
+def _with_partition_cols(columns):
+    # YEAR/MONTH werden für Filter und Sortierung immer mitgeladen
+    return list(columns) + [c for c in PARTITION_COLS if c not in columns]
+
+
+def _sort_rows(df):
+    return df.sort_values(PARTITION_COLS, kind="stable", ignore_index=True)
+
+
+# === CSV -> Parquet übernehmen ===
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(CSV_FILES)
+    for name in names:
+        df = apply_schema(pd.read_csv(CSV_FILES[name], dtype=_CSV_DTYPES))
+        write_dataset(df, name)
+        print(f"✅ {CSV_FILES[name]} -> {dataset_path(name)} ({len(df)} Zeilen)")
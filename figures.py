@@ -0,0 +1,107 @@
+import base64
+
+import numpy as np
+
+# === Kompakte Plotly-Figuren für das Dashboard ===
+# Statt px.line (ganze Spalten, Hover-Vorlagen, ~7 KB Template) werden die
+# Figuren als dict mit nur den x/y-Arrays gebaut. Die Arrays gehen als typisierte
+# Base64-Arrays ({'dtype', 'bdata'}) an plotly.js, Datumsangaben als Millisekunden
+# auf einer Datumsachse. Das Aussehen von px.line (Hintergrund, Gitter, Farben)
+# wird über wenige Layout-Felder nachgebildet.
+# Reihen mit mehr als PUNKT_BUDGET Punkten werden je Eimer auf Minimum und
+# Maximum reduziert; Spitzen und Täler bleiben sichtbar.
+# Trace 0 ist immer die Historie, Trace 1 immer die Prognose (ggf. leer), damit
+# ein Modellwechsel nur Trace 1 per dash.Patch austauschen muss.
+
+PUNKT_BUDGET = 1000
+
+FARBE_HISTORIE = '#636efa'
+FARBE_PROGNOSE = '#EF553B'
+
+
+def typed_array(values):
+    # Ganzzahlige Werte im int32-Bereich als i4, sonst f8
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf' and len(values):
+        finite = np.isfinite(values) if values.dtype.kind == 'f' else True
+        if np.all(finite) and np.all(values == np.round(values)) and \
+                np.abs(values).max() < 2**31:
+            values = values.astype('<i4')
+        else:
+            values = values.astype('<f8')
+    else:
+        values = values.astype('<f8')
+    return {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def date_array(dates):
+    # Datumsangaben als Millisekunden seit 1970 (Datumsachse)
+    return typed_array(np.asarray(dates, dtype='datetime64[ms]').astype('int64').astype('float64'))
+
+
+def downsample(x, y, budget=PUNKT_BUDGET):
+    # Minimum und Maximum je Eimer plus erster und letzter Punkt, Reihenfolge bleibt
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if budget is None or n <= budget:
+        return x, y
+
+    buckets = max(1, (budget - 2) // 2)
+    inner = np.arange(1, n - 1)
+    segment = (inner - 1) * buckets // (n - 2)
+    order = np.lexsort((y[inner], segment))
+    starts = np.r_[0, np.flatnonzero(np.diff(segment[order])) + 1]
+    ends = np.r_[starts[1:], len(order)] - 1
+
+    keep = np.unique(np.r_[0, inner[order[starts]], inner[order[ends]], n - 1])
+    return x[keep], y[keep]
+
+
+def line_trace(dates, values, name, color, dash=None, budget=PUNKT_BUDGET):
+    dates, values = downsample(dates, values, budget)
+    trace = {
+        'type': 'scatter',
+        'mode': 'lines',
+        'name': name,
+        'x': date_array(dates),
+        'y': typed_array(values),
+        'line': {'color': color},
+    }
+    if dash is not None:
+        trace['line']['dash'] = dash
+    return trace
+
+
+def forecast_trace(dates=None, values=None, name='Prognose 2024'):
+    # Ohne Werte ein leerer Platzhalter an Position 1
+    if dates is None:
+        return {'type': 'scatter', 'mode': 'lines', 'name': name, 'x': [], 'y': [], 'showlegend': False}
+    return line_trace(dates, values, name, FARBE_PROGNOSE, dash='dash')
+
+
+def annotations(text=None):
+    # Hinweis oben rechts im Diagramm, z. B. solange eine Prognose berechnet wird
+    if text is None:
+        return []
+    return [{
+        'text': text, 'xref': 'paper', 'yref': 'paper', 'x': 1, 'y': 1.06,
+        'xanchor': 'right', 'showarrow': False, 'font': {'color': FARBE_PROGNOSE},
+    }]
+
+
+def history_figure(dates, values, title, prognose=None, hinweis=None):
+    return {
+        'data': [
+            dict(line_trace(dates, values, 'Passagiere', FARBE_HISTORIE), showlegend=False),
+            prognose if prognose is not None else forecast_trace(),
+        ],
+        'layout': {
+            'title': {'text': title},
+            'plot_bgcolor': '#E5ECF6',
+            'xaxis': {'type': 'date', 'title': {'text': 'DATE'}, 'gridcolor': 'white'},
+            'yaxis': {'title': {'text': 'PASSENGERS'}, 'gridcolor': 'white'},
+            'legend': {'tracegrouporder': 'normal'},
+            'annotations': annotations(hinweis),
+        },
+    }
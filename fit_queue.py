@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from forecast_models import fit_forecast, metrics
+
+# === Hintergrund-Fits für das Dashboard ===
+# Langsame Modelle werden nicht im Callback gefittet, sondern in einen kleinen
+# Thread-Pool gegeben; das fertige Ergebnis landet im ForecastCache, aus dem der
+# nächste Callback-Aufruf (Polling im Browser) es holt. Läuft für dieselbe
+# (Route, Modell) schon ein Fit, wird keiner zusätzlich gestartet. Ein
+# fehlgeschlagener Fit bleibt als Fehler gemerkt und wird nicht wiederholt; die
+# Warteschlange gehört zu einer Datenversion, mit einer neuen beginnt alles neu.
+# Zusammengefasst wird nur innerhalb eines Prozesses: mit mehreren Workern
+# (gunicorn) fittet jeder Worker dieselbe (Route, Modell) höchstens einmal selbst,
+# über den gemeinsamen Platten-Cache finden sich nur fertige Ergebnisse.
+# Threads statt Prozesse: der Cache wird direkt geteilt, die Reihen müssen nicht
+# serialisiert werden, und Prophet rechnet ohnehin in einem CmdStan-Prozess.
+# Mit metriken (instrumentation.Metriken) geht die Dauer jedes Fits als Zeit
+# "hintergrund_fit" je Modell ein, fehlgeschlagene Fits als Zähler "fehler".
+
+
+def _fit_entry(modell, dff, future_dates, y_true):
+    forecast, y_pred = fit_forecast(modell, dff, future_dates)
+    mae, rmse, r2 = metrics(y_true, forecast)
+    return {'forecast': forecast, 'fitted': y_pred, 'mae': mae, 'rmse': rmse, 'r2': r2}
+
+
+class FitQueue:
+
+    def __init__(self, cache, workers=2, metriken=None):
+        self.cache = cache
+        self.metriken = metriken
+        self.submitted = 0
+        self.coalesced = 0
+        self._jobs = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fit")
+
+    def submit(self, route, modell, dff, future_dates, y_true):
+        # True, wenn ein neuer Fit gestartet wurde; False, wenn schon einer läuft
+        # oder er für diese Datenversion bereits fehlgeschlagen ist
+        key = (route, modell)
+        with self._lock:
+            if key in self._errors:
+                return False
+            if key in self._jobs:
+                self.coalesced += 1
+                return False
+            self.submitted += 1
+            future = self._pool.submit(self._fit, modell, dff, future_dates, y_true)
+            self._jobs[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        return True
+
+    def running(self, route, modell):
+        with self._lock:
+            return (route, modell) in self._jobs
+
+    def error(self, route, modell):
+        # Fehlermeldung eines fehlgeschlagenen Fits, sonst None
+        with self._lock:
+            return self._errors.get((route, modell))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _fit(self, modell, dff, future_dates, y_true):
+        if self.metriken is None:
+            return _fit_entry(modell, dff, future_dates, y_true)
+        with self.metriken.messen("hintergrund_fit", modell=modell):
+            return _fit_entry(modell, dff, future_dates, y_true)
+
+    def _done(self, key, future):
+        # Erst in den Cache, dann aus den laufenden Jobs: wer nicht mehr "läuft"
+        # sieht, findet das Ergebnis sicher im Cache
+        if not future.cancelled():
+            error = future.exception()
+            if error is None:
+                self.cache.put(*key, future.result())
+            else:
+                with self._lock:
+                    self._errors[key] = f"{type(error).__name__}: {error}"
+                if self.metriken is not None:
+                    self.metriken.zaehlen("fehler", callback="hintergrund_fit", modell=key[1])
+        with self._lock:
+            self._jobs.pop(key, None)
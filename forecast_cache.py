@@ -0,0 +1,136 @@
+import os
+import pickle
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+# === Cache für Prognoseergebnisse ===
+# Schlüssel: (Route, Modell, Datenversion). Im Speicher werden höchstens maxsize
+# Einträge gehalten, der am längsten nicht benutzte fliegt zuerst raus (LRU).
+# Mit cache_dir werden Einträge zusätzlich als Pickle-Dateien abgelegt und
+# überstehen einen Neustart. Ändert sich die Datenversion, passen alte
+# Schlüssel nicht mehr; Dateien anderer Versionen werden beim Start entfernt.
+# Auf Platte liegen höchstens disk_maxsize Dateien; darüber werden die am
+# längsten nicht benutzten entfernt (Änderungszeit, bei Treffern aufgefrischt).
+
+
+class ForecastCache:
+
+    def __init__(self, version, maxsize=256, cache_dir=None, disk_maxsize=4096):
+        self.version = version
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if cache_dir is not None:
+            os.makedirs(self._version_dir(), exist_ok=True)
+            self._remove_other_versions()
+
+    def key(self, route, modell):
+        return (route, modell, self.version)
+
+    def get(self, route, modell):
+        key = self.key(route, modell)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store_memory(key, entry)
+        return entry
+
+    def put(self, route, modell, entry):
+        key = self.key(route, modell)
+        with self._lock:
+            self._store_memory(key, entry)
+        self._save(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir is not None:
+            shutil.rmtree(self._version_dir(), ignore_errors=True)
+            os.makedirs(self._version_dir(), exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store_memory(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    # --- Festplatte ---
+
+    def _version_dir(self):
+        return os.path.join(self.cache_dir, self.version)
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self._version_dir(), name + ".pkl")
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if stored_key != key:
+            return None
+        try:
+            # Zuletzt benutzt -> bei der Verdrängung zuletzt dran
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def _save(self, key, entry):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((key, entry), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        # Älteste Dateien über disk_maxsize entfernen; andere Prozesse können
+        # dieselben Dateien gleichzeitig entfernen
+        dateien = []
+        for entry in os.scandir(self._version_dir()):
+            if not entry.name.endswith(".pkl"):
+                continue
+            try:
+                dateien.append((entry.stat().st_mtime_ns, entry.path))
+            except FileNotFoundError:
+                pass
+        if len(dateien) <= self.disk_maxsize:
+            return
+        dateien.sort()
+        for _, path in dateien[:len(dateien) - self.disk_maxsize]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_other_versions(self):
+        for name in os.listdir(self.cache_dir):
+            if name != self.version:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
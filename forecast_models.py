@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# === Prognosemodelle des Dashboards ===
+# Gleiche Konfiguration wie bisher in dashboard_predictions.update_dashboard.
+# sklearn, statsmodels und prophet werden erst beim ersten Fit des jeweiligen
+# Modells importiert, damit der Start des Dashboards nicht darauf wartet.
+
+MODELLE = ['LR', 'HW', 'ARIMA', 'SARIMA', 'PROPHET']
+
+FUTURE_DATES = pd.date_range(start='2024-01-01', end='2024-12-01', freq='MS')
+
+
+def route_series(cube, route):
+    # Lückenlose Monatsreihe eines Knotens ('ALL', 'AB:ORIGIN' oder 'ORIGIN_DEST')
+    # aus dem Würfel (metric_cube.MetricCube); fliegen mehrere Verbindungen eine
+    # Route, wird je Monat summiert, fehlende Monate zählen 0.
+    monthly = cube.series(route, 'PASSENGERS')
+    return monthly.reset_index()
+
+
+def actual_values(cube, route, future_dates=FUTURE_DATES):
+    # Echte Werte im Prognosezeitraum (nur vorhandene Monate, Summen wie in route_series)
+    monthly = cube.series(route, 'PASSENGERS', only_present=True)
+    return monthly[monthly.index.isin(future_dates)]
+
+
+def fit_forecast(modell, dff, future_dates):
+    # dff: lückenlose Monatsreihe mit DATE und PASSENGERS
+    # Rückgabe: Prognose für future_dates und angepasste Werte
+    if modell == 'LR':
+        from sklearn.linear_model import LinearRegression
+
+        timestamp = (dff['DATE'] - dff['DATE'].min()).dt.days
+        X = timestamp.to_frame('timestamp')
+        y = dff['PASSENGERS']
+        model = LinearRegression().fit(X, y)
+        future_X = (future_dates - dff['DATE'].min()).days.values.reshape(-1, 1)
+        y_pred = model.predict(X)
+        forecast = model.predict(future_X)
+
+    elif modell == 'HW':
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+        model = ExponentialSmoothing(dff['PASSENGERS'], trend='add', seasonal='add', seasonal_periods=12)
+        model_fit = model.fit()
+        y_pred = model_fit.fittedvalues
+        forecast = model_fit.forecast(len(future_dates))
+
+    elif modell == 'ARIMA':
+        from statsmodels.tsa.arima.model import ARIMA
+
+        model = ARIMA(dff['PASSENGERS'], order=(1, 1, 1))
+        model_fit = model.fit()
+        y_pred = model_fit.predict(start=1, end=len(dff)-1, typ="levels")
+        forecast = model_fit.forecast(len(future_dates))
+
+    elif modell == 'SARIMA':
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+        model = SARIMAX(dff['PASSENGERS'], order=(1,1,1), seasonal_order=(1,1,1,12))
+        model_fit = model.fit(disp=False)
+        y_pred = model_fit.fittedvalues
+        forecast = model_fit.forecast(len(future_dates))
+
+    elif modell == 'PROPHET':
+        from prophet import Prophet
+
+        prophet_df = dff[['DATE', 'PASSENGERS']].rename(columns={'DATE': 'ds', 'PASSENGERS': 'y'})
+        model = Prophet()
+        model.fit(prophet_df)
+        future_df = pd.DataFrame({'ds': future_dates})
+        forecast_df = model.predict(future_df)
+        forecast = forecast_df['yhat'].values
+        y_pred = model.predict(prophet_df)['yhat']
+
+    else:
+        raise ValueError(f"Unbekanntes Modell: {modell}")
+
+    return np.asarray(forecast, dtype=float), np.asarray(y_pred, dtype=float)
+
+
+def metrics(y_true, forecast):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    mae = mean_absolute_error(y_true, forecast)
+    rmse = np.sqrt(mean_squared_error(y_true, forecast))
+    r2 = r2_score(y_true, forecast)
+    return mae, rmse, r2
@@ -0,0 +1,163 @@
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import hw_batch
+from datastore import dataset_version, DATA_DIR
+from connection_index import CONNECTION_KEYS
+from metric_cube import cube_for
+from forecast_models import FUTURE_DATES
+from precompute_forecasts import write_store, read_store, store_entry
+
+# === Hierarchische Prognosen ===
+# Knoten: Gesamt ('ALL'), Carrier ('CARRIER:<AIRLINE_ID>'),
+# Abflughafen ('AB:<ORIGIN>'), Route ('ORIGIN_DEST' wie im Dashboard) und
+# Verbindung (KEY-Spalten mit '|' verbunden). Carrier und Abflughafen sind zwei
+# Gruppierungen derselben Verbindungen, keine Kette.
+#
+# Die dünn besetzte Summenmatrix S (Knoten × Verbindungen) bildet jede Matrix
+# Verbindungen × Monate auf alle Knoten ab: Knotenwerte = S @ Verbindungswerte.
+# Die letzten Zeilen von S sind die Einheitsmatrix (Verbindungsebene).
+#
+# Basisprognosen: hw_batch (legacy-heuristic, gegen statsmodels abgeglichen) auf
+# den Monaten vor FUTURE_DATES, alle Knoten in einem Fit. Abstimmung, danach ist
+# jeder Knoten die Summe seiner Verbindungen:
+#   bu   Bottom-up, Summe der Verbindungsprognosen (nur diese werden gefittet)
+#   ols  ỹ = S (SᵀS)⁻¹ Sᵀ ŷ
+#   wls  wie ols, Gewicht je Knoten 1 / Anzahl Verbindungen (strukturell)
+# Prognosen und Kennzahlen je Knoten liegen in daten/hierarchie.parquet; das
+# Prognose-Dashboard liest sie, statt für 'ALL' oder einen Flughafen neu zu fitten.
+
+METHODEN = ["bu", "ols", "wls"]
+
+HIERARCHIE_PATH = os.path.join(DATA_DIR, "hierarchie.parquet")
+
+
+def load_matrix(future_dates=FUTURE_DATES, cube=None):
+    # Matrix Verbindungen × Monate aller Verbindungen aus dem Würfel (metric_cube),
+    # fehlende Monate = 0, Kalender bis einschließlich future_dates verlängert
+    if cube is None:
+        cube = cube_for()
+
+    all_dates = pd.date_range(cube.dates[0], max(cube.dates[-1], future_dates[-1]), freq="MS")
+    Y = np.zeros((len(cube), len(all_dates)))
+    Y[:, :len(cube.dates)] = cube.matrix("PASSENGERS")
+
+    return Y, all_dates, cube.keys[CONNECTION_KEYS]
+
+
+def summing_matrix(keys):
+    # Knotenliste (NODE, EBENE) und S im CSR-Format, Zeilen in derselben Reihenfolge
+    from scipy import sparse
+
+    n = len(keys)
+    origin = keys["ORIGIN"].astype(str)
+    dest = keys["DEST"].astype(str)
+
+    ebenen = [
+        ("GESAMT", pd.Series("ALL", index=keys.index)),
+        # Carrier-Schlüssel ist AIRLINE_ID; eine Airline hat mehrere UNIQUE_CARRIER_ENTITY
+        ("CARRIER", "CARRIER:" + keys["AIRLINE_ID"].astype(str)),
+        ("FLUGHAFEN", "AB:" + origin),
+        ("ROUTE", origin + "_" + dest),
+    ]
+
+    blocks = []
+    nodes = []
+    for ebene, labels in ebenen:
+        codes, uniques = pd.factorize(labels, sort=True)
+        blocks.append(sparse.csr_matrix((np.ones(n), (codes, np.arange(n))), shape=(len(uniques), n)))
+        nodes.append(pd.DataFrame({"NODE": np.asarray(uniques), "EBENE": ebene}))
+
+    # Verbindungsebene in Zeilenreihenfolge von keys
+    blocks.append(sparse.identity(n, format="csr"))
+    nodes.append(pd.DataFrame({"NODE": keys.astype(str).agg("|".join, axis=1), "EBENE": "VERBINDUNG"}))
+
+    return pd.concat(nodes, ignore_index=True), sparse.vstack(blocks, format="csr")
+
+
+def reconcile(S, base, methode="wls"):
+    # base: Basisprognosen aller Knoten (Zeilen wie S) -> kohärente Prognosen aller Knoten
+    n = S.shape[1]
+    if methode == "bu":
+        return S @ base[-n:]
+    if methode not in METHODEN:
+        raise ValueError(f"Unbekannte Methode: {methode}")
+
+    weights = np.ones(S.shape[0])
+    if methode == "wls":
+        weights = 1.0 / np.asarray(S.sum(axis=1)).ravel()
+
+    # (SᵀWS) b = SᵀW ŷ, dünn besetzt zerlegt (LU) und für alle Horizonte gelöst
+    from scipy.sparse.linalg import splu
+
+    StW = S.T.multiply(weights[None, :]).tocsr()
+    bottom = splu((StW @ S).tocsc()).solve(np.ascontiguousarray(StW @ base))
+    return S @ bottom
+
+
+def node_metrics(actual, forecast):
+    # MAE, RMSE, R² je Zeile (R² wie sklearn.metrics.r2_score bei konstanten Werten)
+    err = forecast - actual
+    mae = np.abs(err).mean(axis=1)
+    rmse = np.sqrt((err ** 2).mean(axis=1))
+    ss_res = (err ** 2).sum(axis=1)
+    ss_tot = ((actual - actual.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.where(ss_res == 0, 1.0, 0.0))
+    return mae, rmse, r2
+
+
+def build(Y, dates, keys, methode="wls", future_dates=FUTURE_DATES):
+    # Eine Zeile je Knoten: NODE, EBENE, FORECAST (abgestimmt), BASIS, MAE, RMSE, R2
+    nodes, S = summing_matrix(keys)
+
+    train = (dates < future_dates[0])
+    test = dates.isin(future_dates)
+    h = len(future_dates)
+
+    if methode == "bu":
+        base_bottom = hw_batch.fit(Y[:, train], m=12, h=h, initialization="legacy-heuristic")["forecast"]
+        base = S @ base_bottom
+    else:
+        base = hw_batch.fit(S @ Y[:, train], m=12, h=h, initialization="legacy-heuristic")["forecast"]
+
+    forecast = reconcile(S, base, methode)
+
+    if test.sum() == h:
+        mae, rmse, r2 = node_metrics(S @ Y[:, test], forecast)
+    else:
+        mae = rmse = r2 = np.full(len(nodes), np.nan)
+
+    return nodes.assign(
+        FORECAST=list(forecast), BASIS=list(base),
+        MAE=mae, RMSE=rmse, R2=r2, METHODE=methode
+    )
+
+
+def load_hierarchy(version, path=HIERARCHIE_PATH):
+    # {Knoten: Eintrag wie im ForecastCache}; leer, wenn nicht vorhanden oder veraltet
+    df_nodes = read_store(version, path)
+    if df_nodes is None:
+        return {}
+    return {row.NODE: store_entry(row) for row in df_nodes.itertuples(index=False)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methode", choices=METHODEN, default="wls", help="Abstimmung der Ebenen")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    version = dataset_version("kennzahlen")
+    Y, dates, keys = load_matrix()
+
+    df_nodes = build(Y, dates, keys, methode=args.methode)
+    write_store(df_nodes, version, HIERARCHIE_PATH)
+
+    print(df_nodes.groupby("EBENE", sort=False)[["MAE", "RMSE"]].median().to_string())
+    print(f"✅ {len(df_nodes)} Knoten ({len(keys)} Verbindungen, Methode {args.methode}) "
+          f"gespeichert in {HIERARCHIE_PATH} ({time.perf_counter() - started:.1f} s).")
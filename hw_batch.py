@@ -0,0 +1,316 @@
+import time
+import numpy as np
+
+# === Gebündeltes additives Holt-Winters (Trend und Saison additiv) ===
+# Alle Reihen einer Matrix Y (Verbindungen × Monate) werden gleichzeitig geglättet.
+# Rekursion wie in statsmodels ExponentialSmoothing(trend="add", seasonal="add"):
+#   l_t = α (y_t - s_{t-m}) + (1 - α)(l_{t-1} + b_{t-1})
+#   b_t = β (l_t - l_{t-1}) + (1 - β) b_{t-1}
+#   s_t = γ (y_t - l_{t-1} - b_{t-1}) + (1 - γ) s_{t-m}
+# Bei festen (α, β, γ) sind die angepassten Werte linear in den Startwerten
+# (l_0, b_0, s_1..s_m). Die Startwerte werden daher exakt per kleinster Quadrate
+# bestimmt ("estimated" wie in statsmodels), gesucht wird nur über (α, β, γ):
+# erst ein grobes Gitter, dann eine Mustersuche mit halbierter Schrittweite.
+# Zulässiger Bereich wie in statsmodels: 0 <= β <= α <= 1, 0 <= γ <= 1 - α.
+# Prognose wie in statsmodels: für h = m, 2m, ... wird der Saisonwert vor der
+# letzten Aktualisierung verwendet, damit die Ergebnisse direkt vergleichbar sind.
+# Nur "legacy-heuristic" ist per validate gegen statsmodels abgeglichen; mit
+# "estimated" findet die Suche andere Optima als statsmodels (Prognosen weichen
+# deutlich ab). Dashboard und Pipeline nutzen für 'HW' daher statsmodels, die
+# batch-Engine in "Holt Winter komplett.py" standardmäßig legacy-heuristic.
+
+GRID = np.linspace(0.0, 1.0, 11)
+
+# Maximale Anzahl gleichzeitig gerechneter (Reihe, Parameter)-Kombinationen
+BATCH = 16384
+
+
+def _smooth(Y, params, m, level0, trend0, season0):
+    # Y: (B, n), params: (B, 3), Startwerte: (B, K), (B, K), (B, K, m)
+    # K Zustandsspalten werden parallel geglättet; die Beobachtung geht nur in Spalte 0 ein.
+    B, n = Y.shape
+    K = level0.shape[1]
+    alpha = params[:, 0:1]
+    beta = params[:, 1:2]
+    gamma = params[:, 2:3]
+
+    level = level0.copy()
+    trend = trend0.copy()
+    season = season0.copy()
+    fitted = np.empty((B, K, n))
+
+    onehot = np.zeros(K)
+    onehot[0] = 1.0
+
+    for t in range(n):
+        y = Y[:, t:t + 1] * onehot
+        s_old = season[:, :, t % m].copy()
+        base = level + trend
+
+        fitted[:, :, t] = base + s_old
+
+        new_level = alpha * (y - s_old) + (1 - alpha) * base
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        season[:, :, t % m] = gamma * (y - base) + (1 - gamma) * s_old
+        level = new_level
+
+    # Saisonwerte für die Prognose (siehe oben: Schritt h = m nutzt den alten Wert)
+    season_fc = season.copy()
+    season_fc[:, :, (n - 1) % m] = s_old
+
+    return fitted, level, trend, season_fc
+
+
+def _forecast_season(season, n, m, h):
+    # Spalten des Saisonpuffers für die Prognoseschritte 1..h
+    steps = np.arange(1, h + 1)
+    return season[..., (n + steps - 1) % m]
+
+
+def _basis(B, m):
+    # Spalte 0: Beobachtungen mit Startwerten 0, Spalten 1..m+2: Einheitsstartwerte
+    K = m + 3
+    level0 = np.zeros((B, K))
+    trend0 = np.zeros((B, K))
+    season0 = np.zeros((B, K, m))
+    level0[:, 1] = 1.0
+    trend0[:, 2] = 1.0
+    season0[:, 3:, :] = np.eye(m)
+    return level0, trend0, season0
+
+
+def _initial_simple(Y, m):
+    # Startwerte wie statsmodels initialization_method="legacy-heuristic"
+    level = Y[:, :m].mean(axis=1)
+    trend = (Y[:, m:2 * m].mean(axis=1) - level) / m
+    season = Y[:, :m] - level[:, None]
+    return np.concatenate([level[:, None], trend[:, None], season], axis=1)
+
+
+def _solve(Y, params, m, h, initialization):
+    # SSE (und bei h != None die Prognose) für gegebene (α, β, γ)
+    B, n = Y.shape
+
+    if initialization == "legacy-heuristic":
+        # Startwerte stehen fest -> eine einzige Zustandsspalte genügt
+        x0 = _initial_simple(Y, m)
+        fitted, level, trend, season = _smooth(
+            Y, params, m, x0[:, 0:1], x0[:, 1:2], x0[:, None, 2:].copy()
+        )
+        resid = Y - fitted[:, 0, :]
+        coef = np.ones((B, 1))
+    else:
+        fitted, level, trend, season = _smooth(Y, params, m, *_basis(B, m))
+
+        f0 = fitted[:, 0, :]
+        A = fitted[:, 1:, :].transpose(0, 2, 1)
+        r = Y - f0
+
+        # Optimale Startwerte per Normalgleichungen; Niveau und Saison sind gemeinsam
+        # nur bis auf eine Konstante bestimmt, die kleine Regularisierung wählt dann
+        # die Lösung minimaler Norm
+        AtA = np.einsum("bti,btj->bij", A, A)
+        Atr = np.einsum("bti,bt->bi", A, r)
+        ridge = 1e-10 * np.trace(AtA, axis1=1, axis2=2)[:, None, None] * np.eye(m + 2)
+        x0 = np.linalg.solve(AtA + ridge, Atr[:, :, None])[:, :, 0]
+
+        resid = r - np.einsum("bti,bi->bt", A, x0)
+        coef = np.concatenate([np.ones((B, 1)), x0], axis=1)
+
+    sse = np.einsum("bt,bt->b", resid, resid)
+
+    if h is None:
+        return sse, None
+
+    steps = np.arange(1, h + 1)
+    last_level = np.einsum("bk,bk->b", level, coef)
+    last_trend = np.einsum("bk,bk->b", trend, coef)
+    last_season = np.einsum("bkj,bk->bj", season, coef)
+
+    result = {
+        "fitted": Y - resid,
+        "forecast": last_level[:, None] + steps * last_trend[:, None] + _forecast_season(last_season, n, m, h),
+        "initial": x0,
+        "sse": sse,
+    }
+    return sse, result
+
+
+def _sse(Y, params, m, initialization):
+    # SSE für viele Kombinationen, in Blöcken gerechnet
+    out = np.empty(len(Y))
+    for start in range(0, len(Y), BATCH):
+        stop = start + BATCH
+        out[start:stop] = _solve(Y[start:stop], params[start:stop], m, None, initialization)[0]
+    return out
+
+
+def _project(params):
+    # Auf den zulässigen Bereich abbilden
+    alpha = np.clip(params[..., 0], 0.0, 1.0)
+    beta = np.clip(params[..., 1], 0.0, alpha)
+    gamma = np.clip(params[..., 2], 0.0, 1.0 - alpha)
+    return np.stack([alpha, beta, gamma], axis=-1)
+
+
+def _grid_search(Y, m, initialization):
+    grid = np.array(np.meshgrid(GRID, GRID, GRID, indexing="ij")).reshape(3, -1).T
+    grid = np.unique(_project(grid), axis=0)
+    n_routes, n_grid = len(Y), len(grid)
+
+    Yr = np.repeat(Y, n_grid, axis=0)
+    Pr = np.tile(grid, (n_routes, 1))
+    sse = _sse(Yr, Pr, m, initialization).reshape(n_routes, n_grid)
+
+    return grid[np.argmin(sse, axis=1)], np.min(sse, axis=1)
+
+
+def _pattern_search(Y, params, sse, m, initialization, step, min_step, max_rounds):
+    n_routes = len(Y)
+    params = params.copy()
+    sse = sse.copy()
+    step = np.full(n_routes, step)
+    # Achsen plus Richtungen entlang der Ränder β = α und γ = 1 - α
+    directions = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], [1, 0, -1]], dtype=float)
+    directions = np.concatenate([directions, -directions])
+
+    for _ in range(max_rounds):
+        active = step >= min_step
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+
+        # Nachbarn je aktiver Reihe: ±Schritt in jede Richtung
+        cand = params[idx, None, :] + step[idx, None, None] * directions[None, :, :]
+        cand = _project(cand).reshape(-1, 3)
+        cand_sse = _sse(np.repeat(Y[idx], len(directions), axis=0), cand, m, initialization).reshape(len(idx), -1)
+
+        best = np.argmin(cand_sse, axis=1)
+        best_sse = cand_sse[np.arange(len(idx)), best]
+        improved = best_sse < sse[idx]
+
+        upd = idx[improved]
+        params[upd] = cand.reshape(len(idx), -1, 3)[improved, best[improved]]
+        sse[upd] = best_sse[improved]
+        step[idx[~improved]] /= 2
+
+    return params, sse
+
+
+def fit(Y, m=12, h=12, initialization="legacy-heuristic", start_params=None, min_step=1e-3, max_rounds=60):
+    # Y: (Anzahl Reihen × Monate), vollständig ohne NaN.
+    # start_params: (Anzahl Reihen × 3) aus einem früheren Fit -> nur lokale Suche (Warmstart).
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[None, :]
+
+    # Skalieren für eine stabile Regularisierung, am Ende zurückrechnen
+    scale = np.abs(Y).max(axis=1, keepdims=True)
+    scale[scale == 0] = 1.0
+    Ys = Y / scale
+
+    if start_params is None:
+        params, sse = _grid_search(Ys, m, initialization)
+        step = 0.1
+    else:
+        params = _project(np.asarray(start_params, dtype=float))
+        sse = _sse(Ys, params, m, initialization)
+        step = 0.05
+
+    params, _ = _pattern_search(Ys, params, sse, m, initialization, step, min_step, max_rounds)
+
+    result = {"params": params}
+    for start in range(0, len(Ys), BATCH):
+        part = _solve(Ys[start:start + BATCH], params[start:start + BATCH], m, h, initialization)[1]
+        for key, value in part.items():
+            result.setdefault(key, []).append(value)
+    for key in ("fitted", "forecast", "initial", "sse"):
+        result[key] = np.concatenate(result[key])
+
+    result["fitted"] *= scale
+    result["forecast"] *= scale
+    result["initial"] *= scale
+    result["sse"] *= scale[:, 0] ** 2
+    return result
+
+
+def smooth(Y, params, initial, m=12, h=12):
+    # Rekursion mit festen Parametern und Startwerten (l_0, b_0, s_1..s_m)
+    Y = np.asarray(Y, dtype=float)
+    params = np.asarray(params, dtype=float)
+    initial = np.asarray(initial, dtype=float)
+    B, n = Y.shape
+
+    fitted, level, trend, season = _smooth(
+        Y, params, m, initial[:, 0:1], initial[:, 1:2], initial[:, None, 2:].copy()
+    )
+    steps = np.arange(1, h + 1)
+    forecast = level + steps * trend + _forecast_season(season[:, 0, :], n, m, h)
+    return fitted[:, 0, :], forecast
+
+
+# === Abgleich mit statsmodels ===
+def validate(Y, m=12, h=12, initialization="legacy-heuristic"):
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+    Y = np.asarray(Y, dtype=float)
+
+    t0 = time.perf_counter()
+    batch = fit(Y, m=m, h=h, initialization=initialization)
+    t_batch = time.perf_counter() - t0
+
+    # 1) Optimierung: gleicher Ansatz in statsmodels, Reihe für Reihe
+    t0 = time.perf_counter()
+    fits = [
+        ExponentialSmoothing(
+            y, trend="add", seasonal="add", seasonal_periods=m, initialization_method=initialization
+        ).fit()
+        for y in Y
+    ]
+    t_sm = time.perf_counter() - t0
+
+    sse_ratio = batch["sse"] / np.maximum([f.sse for f in fits], 1e-12)
+    scale = np.maximum(np.abs(Y).mean(axis=1), 1.0)
+    fc_diff = np.abs(np.array([f.forecast(h) for f in fits]) - batch["forecast"]).mean(axis=1) / scale
+
+    # 2) Rekursion: identische Parameter und Startwerte -> identische Prognose
+    rec_err = []
+    for i, y in enumerate(Y):
+        init = batch["initial"][i]
+        a, b, g = batch["params"][i]
+        known = ExponentialSmoothing(
+            y, trend="add", seasonal="add", seasonal_periods=m,
+            initialization_method="known",
+            initial_level=init[0], initial_trend=init[1], initial_seasonal=init[2:]
+        ).fit(smoothing_level=a, smoothing_trend=b, smoothing_seasonal=g, optimized=False)
+        rec_err.append(np.max(np.abs(known.forecast(h) - batch["forecast"][i])) / scale[i])
+
+    return {
+        "routes": len(Y),
+        "max_rel_recursion_error": float(np.max(rec_err)),
+        "median_sse_ratio": float(np.median(sse_ratio)),
+        "max_sse_ratio": float(np.max(sse_ratio)),
+        "median_rel_forecast_diff": float(np.median(fc_diff)),
+        "p95_rel_forecast_diff": float(np.quantile(fc_diff, 0.95)),
+        "seconds_batch": t_batch,
+        "seconds_statsmodels": t_sm,
+        "speedup": t_sm / t_batch,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import warnings
+    from datastore import read_dataset
+
+    warnings.simplefilter("ignore")
+
+    # Trainingszeitraum 2022–2023 aller vollständigen Verbindungen
+    key_cols = ["AIRLINE_ID", "UNIQUE_CARRIER_ENTITY", "ORIGIN", "DEST", "AIRCRAFT_TYPE"]
+    df = read_dataset("kennzahlen", columns=key_cols + ["YEAR", "MONTH", "PASSENGERS"], years=[2022, 2023])
+    Y = df.pivot_table(index=key_cols, columns=["YEAR", "MONTH"], values="PASSENGERS", aggfunc="sum", observed=True)
+    Y = Y.dropna().to_numpy()
+
+    initialization = sys.argv[1] if len(sys.argv) > 1 else "legacy-heuristic"
+    for key, value in validate(Y, initialization=initialization).items():
+        print(f"{key}: {value}")
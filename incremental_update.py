@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import pandas as pd
+
+from datastore import DATA_DIR, PARTITION_COLS, dataset_partitions, write_partitions
+from match_connections import KEY_COLS, USE_COLS, monthly_pax, update_stats
+from connections import aggregate_streaming, read_passed
+from Datenvorbereitung import add_kennzahlen
+
+# === Monatliches Update der Datenaufbereitung ===
+# Verarbeitet nur die neue(n) T100-Monatsdatei(en) statt alle Jahre neu:
+#   1. Qualifikationszähler (Summe ceil(PASSENGERS / DEPARTURES_PERFORMED) je
+#      Verbindung und Monat) -> daten/qualifikation/, dieselben Monate auch in
+#      der Jahresstatistik daten/qualifikation_jahre.parquet (--statistik/--sweep)
+#   2. Aggregation der bereits qualifizierten Verbindungen -> daten/aggregiert/
+#   3. PAX_PRO_FLUG und AUSLASTUNG nur für diese Zeilen -> daten/kennzahlen/
+# Geschrieben werden nur die YEAR/MONTH-Partitionen der neuen Datei; eine
+# korrigierte Datei für einen schon verarbeiteten Monat ersetzt diesen Monat.
+# Die Menge der qualifizierten Verbindungen (passed_connections.csv) bleibt
+# unverändert, das Manifest hält je Monat fest, wie viele davon unter k liegen
+# oder fehlen. Eine neue Qualifikation über andere Jahre bleibt ein voller Lauf
+# von match_connections.py.
+
+MANIFEST_PATH = os.path.join(DATA_DIR, "manifest.json")
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {"basis": [], "monate": {}}
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def month_label(year, month):
+    return f"{year}-{month:02d}"
+
+
+def month_counters(df_raw):
+    # Lange Tabelle KEY_COLS + YEAR + MONTH + NUMPAX, gleiche Zählung wie match_connections
+    frames = []
+    for year, df_year in df_raw.groupby("YEAR", sort=True):
+        numpax = monthly_pax(df_year).stack().dropna().astype("int64").rename("NUMPAX")
+        frames.append(numpax.reset_index().assign(YEAR=year))
+    return pd.concat(frames, ignore_index=True)[KEY_COLS + PARTITION_COLS + ["NUMPAX"]]
+
+
+def update(path, passed_csv="passed_connections.csv", k=100, force=False):
+    started = time.perf_counter()
+    manifest = load_manifest()
+
+    # Erster Lauf: Monate aus dem vollen Aufbau als Basis festhalten
+    if not manifest["monate"] and not manifest["basis"]:
+        manifest["basis"] = [month_label(y, m) for y, m in dataset_partitions("aggregiert")]
+
+    sha1 = file_sha1(path)
+    df_raw = pd.read_csv(path, usecols=USE_COLS + ["YEAR"], dtype={"UNIQUE_CARRIER_ENTITY": str})
+    months = sorted(set(zip(df_raw["YEAR"].tolist(), df_raw["MONTH"].tolist())))
+
+    if not force and all(manifest["monate"].get(month_label(y, m), {}).get("sha1") == sha1 for y, m in months):
+        print(f"⏭️ {path} wurde bereits verarbeitet.")
+        return manifest
+
+    # 1. Qualifikationszähler der neuen Monate
+    counters = month_counters(df_raw)
+    write_partitions(counters, "qualifikation")
+    update_stats(counters)
+
+    # 2./3. Aggregation und Kennzahlen nur für die neuen Zeilen
+    df_agg = aggregate_streaming([path], passed_csv)
+    write_partitions(df_agg, "aggregiert")
+    write_partitions(add_kennzahlen(df_agg.copy()), "kennzahlen")
+
+    # Kontrolle gegen die qualifizierten Verbindungen
+    passed = pd.MultiIndex.from_frame(read_passed(passed_csv)[KEY_COLS])
+    for year, month in months:
+        in_month = (counters["YEAR"] == year) & (counters["MONTH"] == month)
+        numpax = counters[in_month].set_index(KEY_COLS)["NUMPAX"].reindex(passed)
+
+        manifest["monate"][month_label(year, month)] = {
+            "datei": os.path.basename(path),
+            "sha1": sha1,
+            "zeilen_roh": int(((df_raw["YEAR"] == year) & (df_raw["MONTH"] == month)).sum()),
+            "zeilen_aggregiert": int(((df_agg["YEAR"] == year) & (df_agg["MONTH"] == month)).sum()),
+            "k": k,
+            "unter_k": int((numpax < k).sum()),
+            "fehlend": int(numpax.isna().sum()),
+            "verarbeitet": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    save_manifest(manifest)
+
+    for year, month in months:
+        entry = manifest["monate"][month_label(year, month)]
+        print(f"✅ {month_label(year, month)}: {entry['zeilen_aggregiert']} Zeilen ergänzt, "
+              f"{entry['unter_k']} Verbindungen unter k={k}, {entry['fehlend']} ohne Daten.")
+    print(f"⏱️ {time.perf_counter() - started:.1f} s")
+
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dateien", nargs="+", help="Neue T100-Dateien (ein oder mehrere Monate)")
+    parser.add_argument("--passed", default="passed_connections.csv")
+    parser.add_argument("-k", type=int, default=100)
+    parser.add_argument("--force", action="store_true", help="Auch bereits verarbeitete Dateien neu einlesen")
+    args = parser.parse_args()
+
+    for path in args.dateien:
+        update(path, passed_csv=args.passed, k=args.k, force=args.force)
@@ -0,0 +1,156 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# === Messpunkte für die Dashboard-Callbacks ===
+# Metriken sammelt Zähler und Zeiten je Name und Labels (z. B. Callback, Stufe,
+# Modell) im Speicher: Anzahl, Summe, Maximum und ein Histogramm mit festen
+# Grenzen in Millisekunden, aus dem p50/p95 geschätzt werden. Ein Aufruf ist
+# ein perf_counter-Paar und ein Dict-Update unter einem Lock (wenige µs),
+# daher bleibt die Messung auch im Betrieb an.
+#
+# Aufruf misst einen Callback-Aufruf mit seinen Stufen, trägt sie am Ende in die
+# Metriken ein und schreibt eine JSON-Zeile in den Logger "psba.metriken".
+
+GRENZEN_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+log = logging.getLogger("psba.metriken")
+
+
+class Metriken:
+
+    def __init__(self):
+        self.gestartet = time.time()
+        self._zeiten = {}
+        self._zaehler = {}
+        self._lock = threading.Lock()
+
+    def zeit(self, name, sekunden, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        ms = sekunden * 1000
+        bucket = next((i for i, grenze in enumerate(GRENZEN_MS) if ms <= grenze), len(GRENZEN_MS))
+        with self._lock:
+            eintrag = self._zeiten.get(key)
+            if eintrag is None:
+                eintrag = self._zeiten[key] = [0, 0.0, 0.0, [0] * (len(GRENZEN_MS) + 1)]
+            eintrag[0] += 1
+            eintrag[1] += sekunden
+            eintrag[2] = max(eintrag[2], sekunden)
+            eintrag[3][bucket] += 1
+
+    def zaehlen(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._zaehler[key] = self._zaehler.get(key, 0) + n
+
+    @contextmanager
+    def messen(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.zeit(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        # JSON-fähige Momentaufnahme für den Metrik-Endpunkt
+        with self._lock:
+            zeiten = [(key, list(e[:3]), list(e[3])) for key, e in self._zeiten.items()]
+            zaehler = list(self._zaehler.items())
+
+        return {
+            "seit": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.gestartet)),
+            "zeiten": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "anzahl": anzahl,
+                    "summe_s": round(summe, 6),
+                    "mittel_ms": round(summe / anzahl * 1000, 3),
+                    "max_ms": round(maximum * 1000, 3),
+                    "p50_ms": _quantil(buckets, 0.5),
+                    "p95_ms": _quantil(buckets, 0.95),
+                }
+                for (name, labels), (anzahl, summe, maximum), buckets in sorted(zeiten)
+            ],
+            "zaehler": [
+                {"name": name, "labels": dict(labels), "wert": wert}
+                for (name, labels), wert in sorted(zaehler)
+            ],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._zeiten.clear()
+            self._zaehler.clear()
+        self.gestartet = time.time()
+
+
+def _quantil(buckets, q):
+    # Obere Grenze des Histogramm-Eimers, in dem das Quantil liegt (None = über dem größten)
+    ziel = q * sum(buckets)
+    kumuliert = 0
+    for i, anzahl in enumerate(buckets):
+        kumuliert += anzahl
+        if kumuliert >= ziel:
+            return GRENZEN_MS[i] if i < len(GRENZEN_MS) else None
+    return None
+
+
+class Aufruf:
+    # Ein Callback-Aufruf: Gesamtzeit und Stufenzeiten mit denselben Labels.
+    # Zusätzliche Felder nur fürs Log (z. B. die Route) kommen in info.
+
+    def __init__(self, metriken, callback, **labels):
+        self.metriken = metriken
+        self.callback = callback
+        self.labels = labels
+        self.info = {}
+        self.stufen = {}
+        self._started = None
+
+    @contextmanager
+    def stufe(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stufen[name] = self.stufen.get(name, 0.0) + time.perf_counter() - started
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dauer = time.perf_counter() - self._started
+        self.metriken.zeit("callback", dauer, callback=self.callback, **self.labels)
+        for name, sekunden in self.stufen.items():
+            self.metriken.zeit("stufe", sekunden, callback=self.callback, stufe=name, **self.labels)
+        if exc_type is not None:
+            self.metriken.zaehlen("fehler", callback=self.callback, **self.labels)
+
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps({
+                "zeit": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "callback": self.callback,
+                **self.labels,
+                **self.info,
+                "dauer_ms": round(dauer * 1000, 3),
+                "stufen_ms": {name: round(s * 1000, 3) for name, s in self.stufen.items()},
+                "fehler": None if exc_type is None else exc_type.__name__,
+            }, ensure_ascii=False, default=str))
+        return False
+
+
+def json_log(path):
+    # Strukturiertes Log: eine JSON-Zeile je Callback-Aufruf in path
+    import os
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    return handler
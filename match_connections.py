@@ -1,18 +1,30 @@
 #! /usr/bin/python3
 import os, sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import numpy as np
 import math
 
-def check_connection(con, df, k):
-
-    air, uce, org, dst, atp = con
+from datastore import DATA_DIR
+
+KEY_COLS = ["AIRLINE_ID", "UNIQUE_CARRIER_ENTITY", "ORIGIN", "DEST", "AIRCRAFT_TYPE"]
+USE_COLS = ["PASSENGERS", "DEPARTURES_PERFORMED", "SEATS"] + KEY_COLS + ["MONTH"]
+ALL_MONTHS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+YEAR_FILES = [
+    "T_T100I_SEGMENT_ALL_CARRIER_2022.csv",
+    "T_T100I_SEGMENT_ALL_CARRIER_2023.csv",
+    "T_T100I_SEGMENT_ALL_CARRIER_2024.csv",
+]
+# Qualifikationsstatistik je Verbindung und Jahr (siehe year_stats); jede
+# Schwelle k und jede Monatsauswahl ist danach nur noch ein Filter darueber
+STATS_PATH = os.path.join(DATA_DIR, "qualifikation_jahre.parquet")
+
+def check_connection(con, connections, k):
+    # connections: connection_index.ConnectionIndex(df, KEY_COLS) eines Jahres
     allmonths = [1, 2, 3, 4,5, 6,7, 8,9, 10,11,12]
 
-    subdf = df[(df["AIRLINE_ID"] == air)]
-    subdf = subdf[(subdf["UNIQUE_CARRIER_ENTITY"] == uce)]
-    subdf = subdf[(subdf["ORIGIN"] == org)]
-    subdf = subdf[(subdf["DEST"] == dst)]
-    subdf = subdf[(subdf["AIRCRAFT_TYPE"] == atp)]
+    subdf = connections.get(con)
 
     months = [int(a) for a in subdf["MONTH"]]
 
@@ -47,70 +59,181 @@ def check_connection(con, df, k):
 
     return ok
 
-def print_connection(con, df):
-    air, uce, org, dst, atp = con
-
-    subdf = df[(df["AIRLINE_ID"] == air)]
-    subdf = subdf[(subdf["UNIQUE_CARRIER_ENTITY"] == uce)]
-    subdf = subdf[(subdf["ORIGIN"] == org)]
-    subdf = subdf[(subdf["DEST"] == dst)]
-    subdf = subdf[(subdf["AIRCRAFT_TYPE"] == atp)]
+def print_connection(con, connections):
+    subdf = connections.get(con)
 
     print(subdf)
 
-def read(csv1, csv2, csv3):
-    df1 = pd.read_csv(csv1, sep=",", usecols=["PASSENGERS", "DEPARTURES_PERFORMED", "SEATS", "AIRLINE_ID","UNIQUE_CARRIER_ENTITY","ORIGIN","DEST","AIRCRAFT_TYPE","MONTH"])
-    df2 = pd.read_csv(csv2, sep=",", usecols=["PASSENGERS", "DEPARTURES_PERFORMED", "SEATS", "AIRLINE_ID","UNIQUE_CARRIER_ENTITY","ORIGIN","DEST","AIRCRAFT_TYPE","MONTH"])
-    df3 = pd.read_csv(csv3, sep=",", usecols=["PASSENGERS", "DEPARTURES_PERFORMED", "SEATS", "AIRLINE_ID","UNIQUE_CARRIER_ENTITY","ORIGIN","DEST","AIRCRAFT_TYPE","MONTH"])
-
-    k = 100
-
-    connections = set()
-    passed = []
-
-    for index, row in df1.iterrows():
-        air = row["AIRLINE_ID"]
-        uce = row["UNIQUE_CARRIER_ENTITY"]
-        org = row["ORIGIN"]
-        dst = row["DEST"]
-        atp = row["AIRCRAFT_TYPE"]
-
-        con = air, uce, org, dst, atp
-
-        connections.add(con)
-
-    print("Found",len(connections), " connections in first data frame.")
-
-    for con in connections:
-
-        result = check_connection(con, df1, k)
-
-        if (result == True):
-            result = check_connection(con, df2, k)
-
-        if (result == True):
-            result = check_connection(con, df3, k)
-
-        if (result == True):
-            passed.append(con)
+def monthly_pax(df):
+    # Summe von ceil(PASSENGERS / DEPARTURES_PERFORMED) je Verbindung und Monat
+    # in einem einzigen groupby. Zeilen ohne durchgefuehrte Fluege zaehlen wie in
+    # check_connection fuer die Monatsabdeckung, tragen aber keine Passagiere bei.
+    pax = np.trunc(df["PASSENGERS"].to_numpy(dtype=float))
+    dep = np.trunc(df["DEPARTURES_PERFORMED"].to_numpy(dtype=float))
+
+    valid = dep > 0
+    pax_per_flight = np.zeros(len(df))
+    pax_per_flight[valid] = np.ceil(pax[valid] / dep[valid])
+
+    sums = (
+        df[KEY_COLS + ["MONTH"]]
+        .assign(NUMPAX=pax_per_flight)
+        .groupby(KEY_COLS + ["MONTH"], sort=False)["NUMPAX"]
+        .sum()
+    )
+
+    # Zeilen = Verbindungen, Spalten = Monate, NaN = Monat nicht vorhanden
+    return sums.unstack("MONTH")
+
+def qualified(table, k, months=ALL_MONTHS):
+    # Alle geforderten Monate muessen vorhanden sein und jeweils >= k Passagiere haben
+    table = table.reindex(columns=months)
+    ok = (table >= k).all(axis=1)
+
+    return table.index[ok]
+
+def year_stats(csv):
+    # Zusammenfassung einer T100-Jahresdatei je Verbindung (eine Zeile):
+    # MONATE     Bitmaske der vorhandenen Monate (Bit 0 = Januar)
+    # MIN_NUMPAX kleinste Monatssumme ceil(PASSENGERS / DEPARTURES_PERFORMED)
+    #            ueber die vorhandenen Monate
+    # NUMPAX_01 .. NUMPAX_12 die Monatssummen selbst, NaN = Monat fehlt
+    df = pd.read_csv(csv, sep=",", usecols=USE_COLS + ["YEAR"], dtype={"UNIQUE_CARRIER_ENTITY": str})
+    return _year_summary(monthly_pax(df), int(df["YEAR"].iat[0]) if len(df) else 0)
+
+def _year_summary(table, year):
+    # table: Verbindungen x Monate (Monatssummen, NaN = Monat fehlt) -> Zeilen wie year_stats
+    table = table.reindex(columns=ALL_MONTHS).astype(float)
+    present = table.notna().to_numpy()
+    stats = table.set_axis([f"NUMPAX_{m:02d}" for m in ALL_MONTHS], axis=1).reset_index()
+    stats.insert(len(KEY_COLS), "YEAR", year)
+    stats.insert(len(KEY_COLS) + 1, "MONATE", (present * (1 << np.arange(12))).sum(axis=1).astype("int16"))
+    stats.insert(len(KEY_COLS) + 2, "MIN_NUMPAX", table.min(axis=1).to_numpy())
+    return stats
+
+def build_stats(*csvs, workers=None):
+    # Beliebig viele Jahresdateien, je Datei ein Prozess (workers begrenzt das,
+    # z. B. wegen Speicher). Ergebnis aller Jahre untereinander, Reihenfolge wie
+    # die Dateien, und gespeichert unter STATS_PATH.
+    if not csvs:
+        raise ValueError("Mindestens eine Jahresdatei angeben")
+
+    workers = min(len(csvs), workers or len(csvs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(year_stats, csvs))
+    else:
+        frames = [year_stats(csv) for csv in csvs]
+
+    stats = pd.concat(frames, ignore_index=True)
+    _write_stats(stats)
+    return stats
+
+def update_stats(counters):
+    # Monatszaehler (KEY_COLS + YEAR + MONTH + NUMPAX, z. B. aus incremental_update)
+    # in die gespeicherte Statistik uebernehmen: die Monate der Zaehler ersetzen
+    # die bisherigen Werte ihres Jahres, MONATE und MIN_NUMPAX werden neu gebildet.
+    # Ohne gespeicherte Statistik passiert nichts (None).
+    if not os.path.exists(STATS_PATH):
+        return None
+    stats = load_stats()
+    numpax_cols = [f"NUMPAX_{m:02d}" for m in ALL_MONTHS]
+
+    updated = {}
+    for year, neu in counters.groupby("YEAR", sort=True):
+        monate = neu.set_index(KEY_COLS + ["MONTH"])["NUMPAX"].unstack("MONTH")
+        alt = stats[stats["YEAR"] == year].set_index(KEY_COLS)[numpax_cols].set_axis(ALL_MONTHS, axis=1)
+        index = alt.index.append(monate.index.difference(alt.index))
+        table = alt.reindex(index)
+        for month in monate.columns:
+            table[month] = monate[month].reindex(index).astype(float)
+        updated[int(year)] = _year_summary(table.dropna(how="all"), int(year))
+
+    # Jahre in bisheriger Reihenfolge, neue Jahre am Ende
+    years = list(dict.fromkeys(stats["YEAR"].tolist() + sorted(updated)))
+    stats = pd.concat(
+        [updated.get(year, stats[stats["YEAR"] == year]) for year in years], ignore_index=True
+    )
+    _write_stats(stats)
+    return stats
+
+def _write_stats(stats):
+    os.makedirs(os.path.dirname(STATS_PATH), exist_ok=True)
+    tmp = STATS_PATH + ".tmp"
+    stats.to_parquet(tmp, index=False)
+    os.replace(tmp, STATS_PATH)
+
+def load_stats():
+    return pd.read_parquet(STATS_PATH)
+
+def connection_scores(stats, months=ALL_MONTHS):
+    # Je Verbindung die kleinste Monatssumme ueber alle Jahre und die geforderten
+    # Monate; -inf, wenn ein Monat oder ein ganzes Jahr fehlt. Eine Verbindung
+    # besteht Schwelle k genau dann, wenn ihr Wert >= k ist.
+    # Reihenfolge wie im ersten Jahr.
+    if list(months) == ALL_MONTHS:
+        score = stats["MIN_NUMPAX"].where(stats["MONATE"] == (1 << 12) - 1)
+    else:
+        score = stats[[f"NUMPAX_{m:02d}" for m in months]].min(axis=1, skipna=False)
+    score = score.fillna(-np.inf)
+
+    grouped = score.groupby([stats[c] for c in KEY_COLS], sort=False)
+    years = grouped.size()
+    return grouped.min().where(years == stats["YEAR"].nunique(), -np.inf)
+
+def passing(stats, k=100, months=ALL_MONTHS):
+    # Qualifizierte Verbindungen (MultiIndex) ohne erneutes Einlesen der Rohdaten
+    scores = connection_scores(stats, months)
+    return scores.index[scores.to_numpy() >= k]
+
+def sweep(stats, ks, months=ALL_MONTHS):
+    # Anzahl qualifizierter Verbindungen fuer jede Schwelle in ks
+    scores = np.sort(connection_scores(stats, months).to_numpy())
+    ks = np.asarray(list(ks))
+    counts = len(scores) - np.searchsorted(scores, ks, side="left")
+    return pd.DataFrame({"K": ks, "VERBINDUNGEN": counts})
+
+def write_passed(passed, path="passed_connections.csv"):
+    passed.to_frame(index=False).to_csv(path, index=False)
+
+def read(*csvs, k=100, months=ALL_MONTHS, workers=None):
+    # Voller Lauf: Statistik aller Jahre neu aufbauen, dann mit k filtern.
+    # Eine Verbindung ist qualifiziert, wenn sie in jedem Jahr alle Monate mit
+    # >= k Passagieren hat.
+    stats = build_stats(*csvs, workers=workers)
+
+    print("Found", int((stats["YEAR"] == stats["YEAR"].iat[0]).sum()), " connections in first data frame.")
+
+    passed = passing(stats, k, months)
 
     print(len(passed), "connections passed for all data frames.")
-    
-    df_passed = pd.DataFrame(passed, columns=[
-        "AIRLINE_ID", 
-        "UNIQUE_CARRIER_ENTITY", 
-        "ORIGIN", 
-        "DEST", 
-        "AIRCRAFT_TYPE"
-    ])
-    df_passed.to_csv("passed_connections.csv", index=False)
+
+    write_passed(passed)
 
 
     
 if __name__ == "__main__":
-    csv1='T_T100I_SEGMENT_ALL_CARRIER_2022.csv'
-    csv2='T_T100I_SEGMENT_ALL_CARRIER_2023.csv'
-    csv3='T_T100I_SEGMENT_ALL_CARRIER_2024.csv'
-    read(csv1, csv2, csv3)
-
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dateien", nargs="*", default=YEAR_FILES, help="T100-Jahresdateien (Standard 2022-2024)")
+    parser.add_argument("-k", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=0, help="Hoechstens so viele Prozesse (0 = eine je Datei)")
+    parser.add_argument("--monate", help="Geforderte Monate, kommagetrennt (Standard alle 12)")
+    parser.add_argument("--statistik", action="store_true", help=f"Nur aus {STATS_PATH} filtern, Rohdaten nicht lesen")
+    parser.add_argument("--sweep", help="Schwellen, z. B. 50,100,200 oder 0:500:50; nur zaehlen, nichts schreiben")
+    args = parser.parse_args()
+
+    months = [int(m) for m in args.monate.split(",")] if args.monate else ALL_MONTHS
+
+    if args.sweep:
+        if ":" in args.sweep:
+            ks = range(*[int(x) for x in args.sweep.split(":")])
+        else:
+            ks = [int(x) for x in args.sweep.split(",")]
+        stats = load_stats() if args.statistik else build_stats(*args.dateien, workers=args.workers or None)
+        print(sweep(stats, ks, months).to_string(index=False))
+    elif args.statistik:
+        passed = passing(load_stats(), args.k, months)
+        write_passed(passed)
+        print(len(passed), "connections passed for all data frames.")
+    else:
+        read(*args.dateien, k=args.k, months=months, workers=args.workers or None)
@@ -0,0 +1,216 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from datastore import read_dataset, dataset_version, DATA_DIR
+from connection_index import ConnectionIndex, CONNECTION_KEYS, ROUTE_KEYS
+
+# === Dichter Würfel Verbindung × Monat × Kennzahl ===
+# Alle Zeitreihen als ein zusammenhängendes float64-Array
+# werte[Verbindung, Monat, Kennzahl] über einen lückenlosen Monatskalender, dazu
+# die Maske fehlt[Verbindung, Monat] (True = keine Zeile in daten/kennzahlen).
+# Fehlende Monate stehen bei den Summen als 0, bei den Quoten als NaN.
+#
+# Die Verbindungen sind nach ORIGIN, DEST und dem restlichen Schlüssel geordnet:
+# eine Route und ein Abflughafen sind zusammenhängende Zeilenblöcke, ihre Reihe
+# ist eine Summe über einen Slice; die Summe über alle Verbindungen ('ALL') wird
+# einmal beim Aufbau gerechnet. AUSLASTUNG und PAX_PRO_FLUG werden für
+# zusammengefasste Knoten aus den Summen neu gebildet (wie add_kennzahlen).
+#
+# Abgelegt je Datenversion unter daten/wuerfel/<version>/ als .npy (per mmap
+# lesbar, mehrere Prozesse teilen sich die Seiten) plus Schlüssel und Kalender.
+
+METRIKEN = ['PASSENGERS', 'SEATS', 'DEPARTURES_PERFORMED', 'AUSLASTUNG', 'PAX_PRO_FLUG']
+SUMMEN = METRIKEN[:3]
+
+# Zeilenordnung: erst Route, dann der Rest des Verbindungsschlüssels
+ZEILEN_KEYS = ROUTE_KEYS + [c for c in CONNECTION_KEYS if c not in ROUTE_KEYS]
+
+WUERFEL_DIR = os.path.join(DATA_DIR, "wuerfel")
+
+
+def quoten(summen):
+    # AUSLASTUNG und PAX_PRO_FLUG aus (..., 3) Summen PASSENGERS, SEATS, DEPARTURES_PERFORMED
+    pax, seats, deps = summen[..., 0], summen[..., 1], summen[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.stack([np.minimum(pax / seats, 1.0), np.floor(pax / deps)], axis=-1)
+
+
+class MetricCube:
+
+    def __init__(self, werte, fehlt, keys, dates):
+        self.werte = werte
+        self.fehlt = fehlt
+        self.keys = keys
+        self.dates = dates
+
+        self._rows = {key: i for i, key in enumerate(zip(*(keys[c].tolist() for c in CONNECTION_KEYS)))}
+        self._routes = ConnectionIndex(keys, ROUTE_KEYS, presorted=True)
+        self._airports = ConnectionIndex(keys, ['ORIGIN'], presorted=True)
+        self._gesamt = self._reduce(slice(0, len(keys)))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def routes(self):
+        # Alle Routen als 'ORIGIN_DEST'
+        return [f"{origin}_{dest}" for origin, dest in self._routes]
+
+    def rows(self, node):
+        # Zeilen-Slice eines Knotens: Verbindungsschlüssel (Tupel in CONNECTION_KEYS),
+        # 'ALL', 'AB:ORIGIN' oder 'ORIGIN_DEST'
+        if isinstance(node, tuple):
+            i = self._rows.get(node)
+            span = None if i is None else (i, i + 1)
+        elif node == 'ALL':
+            span = (0, len(self))
+        elif node.startswith('AB:'):
+            span = self._airports.span((node[3:],))
+        else:
+            span = self._routes.span(node.split("_"))
+        if span is None:
+            raise KeyError(f"Unbekannter Knoten: {node}")
+        return slice(*span)
+
+    def _reduce(self, rows):
+        # (Summen (Monate, 3), vorhanden (Monate,)) über einen Zeilenbereich
+        if rows.stop - rows.start == 1:
+            return self.werte[rows.start, :, :len(SUMMEN)], ~self.fehlt[rows.start]
+        return self.werte[rows, :, :len(SUMMEN)].sum(axis=0), ~self.fehlt[rows].all(axis=0)
+
+    def reduce(self, node):
+        rows = self.rows(node)
+        if rows.start == 0 and rows.stop == len(self):
+            return self._gesamt
+        return self._reduce(rows)
+
+    def series(self, node, metrik='PASSENGERS', only_present=False):
+        # Monatsreihe eines Knotens vom ersten bis zum letzten vorhandenen Monat,
+        # Lücken dazwischen als 0 (Summen) bzw. NaN (Quoten);
+        # only_present=True lässt fehlende Monate ganz weg
+        summen, present = self.reduce(node)
+        if metrik in SUMMEN:
+            values = summen[:, SUMMEN.index(metrik)]
+        else:
+            values = quoten(summen)[:, METRIKEN.index(metrik) - len(SUMMEN)]
+
+        idx = np.flatnonzero(present)
+        if only_present:
+            keep = idx
+        elif len(idx):
+            keep = np.arange(idx[0], idx[-1] + 1)
+        else:
+            keep = idx
+        return pd.Series(np.asarray(values, dtype='float64')[keep], index=self.dates[keep].rename('DATE'), name=metrik)
+
+    def matrix(self, metrik='PASSENGERS'):
+        # Verbindungen × Monate einer Kennzahl (Sicht, keine Kopie)
+        return self.werte[:, :, METRIKEN.index(metrik)]
+
+
+def build_cube(df=None):
+    # Aus daten/kennzahlen oder einem Frame mit CONNECTION_KEYS, YEAR, MONTH und SUMMEN
+    if df is None:
+        df = read_dataset("kennzahlen", columns=CONNECTION_KEYS + ['YEAR', 'MONTH'] + SUMMEN)
+
+    grouped = df.groupby(ZEILEN_KEYS, sort=True, observed=True)
+    row = grouped.ngroup().to_numpy()
+    keys = grouped.size().index.to_frame(index=False)[ZEILEN_KEYS]
+
+    monat = df['YEAR'].to_numpy(dtype='int64') * 12 + df['MONTH'].to_numpy(dtype='int64') - 1
+    valid = row >= 0
+    row, monat = row[valid], monat[valid]
+    start = int(monat.min())
+    col = monat - start
+    dates = pd.date_range(f"{start // 12}-{start % 12 + 1:02d}-01", periods=int(col.max()) + 1, freq='MS')
+
+    summen = np.zeros((len(keys), len(dates), len(SUMMEN)))
+    np.add.at(summen, (row, col), df[SUMMEN].to_numpy(dtype='float64')[valid])
+    fehlt = np.ones((len(keys), len(dates)), dtype=bool)
+    fehlt[row, col] = False
+
+    werte = np.ascontiguousarray(np.concatenate([summen, quoten(summen)], axis=2))
+    return MetricCube(werte, fehlt, keys, dates)
+
+
+def cube_path(version):
+    return os.path.join(WUERFEL_DIR, version)
+
+
+def save_cube(cube, version):
+    # In ein temporäres Verzeichnis schreiben und umbenennen; alte Versionen entfernen
+    path = cube_path(version)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "werte.npy"), cube.werte)
+    np.save(os.path.join(tmp, "fehlt.npy"), cube.fehlt)
+    cube.keys.to_parquet(os.path.join(tmp, "schluessel.parquet"), index=False)
+    with open(os.path.join(tmp, "kalender.json"), "w", encoding="utf-8") as f:
+        json.dump({"start": cube.dates[0].strftime("%Y-%m-%d"), "monate": len(cube.dates), "metriken": METRIKEN}, f)
+
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Ein anderer Prozess war schneller, dessen Würfel ist derselbe
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for name in os.listdir(WUERFEL_DIR):
+        if name != version and not name.endswith(".tmp"):
+            shutil.rmtree(os.path.join(WUERFEL_DIR, name), ignore_errors=True)
+    return path
+
+
+def relabel_cube(version):
+    # Vorhandenen Würfel (gleicher Inhalt) unter einer neuen Datenversion ablegen
+    path = cube_path(version)
+    for name in sorted(os.listdir(WUERFEL_DIR)):
+        if name == version or name.endswith(".tmp"):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(os.path.join(WUERFEL_DIR, name), ignore_errors=True)
+        else:
+            os.replace(os.path.join(WUERFEL_DIR, name), path)
+    return path
+
+
+def load_cube(version):
+    # Gespeicherter Würfel zur Datenversion (Arrays per mmap, nur lesend); None wenn keiner da ist
+    path = cube_path(version)
+    if not os.path.isdir(path):
+        return None
+    with open(os.path.join(path, "kalender.json"), encoding="utf-8") as f:
+        kalender = json.load(f)
+    if kalender["metriken"] != METRIKEN:
+        return None
+
+    return MetricCube(
+        np.load(os.path.join(path, "werte.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "fehlt.npy"), mmap_mode="r"),
+        pd.read_parquet(os.path.join(path, "schluessel.parquet")),
+        pd.date_range(kalender["start"], periods=kalender["monate"], freq="MS"),
+    )
+
+
+def cube_for(version=None):
+    # Würfel zur aktuellen (oder angegebenen) Datenversion; fehlt er, wird er gebaut und gespeichert
+    version = version or dataset_version("kennzahlen")
+    cube = load_cube(version)
+    if cube is None:
+        save_cube(build_cube(), version)
+        cube = load_cube(version)
+    return cube
+
+
+if __name__ == "__main__":
+    import time
+
+    started = time.perf_counter()
+    version = dataset_version("kennzahlen")
+    cube = build_cube()
+    path = save_cube(cube, version)
+    print(f"✅ Würfel {cube.werte.shape} ({len(cube)} Verbindungen × {len(cube.dates)} Monate × "
+          f"{len(METRIKEN)} Kennzahlen, {cube.werte.nbytes / 2**20:.1f} MB) in {path} "
+          f"({time.perf_counter() - started:.1f} s).")
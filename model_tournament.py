@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from datastore import dataset_version, DATA_DIR
+from route_index import build_route_index
+from metric_cube import build_cube
+from forecast_models import MODELLE, FUTURE_DATES, fit_forecast, metrics, route_series, actual_values
+from precompute_forecasts import load_data, write_store, read_store, store_entry
+
+# === Modellauswahl je Route ===
+# Alle Modelle werden je Route (und 'ALL') auf den letzten HOLDOUT_MONATE Monaten
+# bewertet, trainiert nur auf den Monaten davor. Gewinner ist das Modell mit dem
+# kleinsten Holdout-RMSE. Für den Gewinner wird zusätzlich die Dashboard-Prognose
+# (Fit auf der ganzen Reihe wie bei der manuellen Modellwahl) gespeichert; das
+# Dashboard zeigt sie unter 'Bestes Modell'.
+#
+# Jedes fertige (Route, Modell) wird sofort als Zeile an den Checkpoint
+# daten/turnier/<Datenversion>.jsonl angehängt. Ein neuer Lauf überspringt
+# alles, was dort schon steht; ändert sich der Datensatz, beginnt er von vorn.
+
+HOLDOUT_MONATE = 12
+
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "turnier")
+GEWINNER_PATH = os.path.join(DATA_DIR, "beste_modelle.parquet")
+
+_cube = None
+
+
+def _init_worker(cube):
+    global _cube
+    warnings.simplefilter("ignore")
+    _cube = cube
+
+
+def _tournament_task(task):
+    route, modell = task
+    started = time.perf_counter()
+    result = {'ROUTE': route, 'MODELL': modell}
+
+    try:
+        dff = route_series(_cube, route)
+        if len(dff) <= HOLDOUT_MONATE:
+            raise ValueError(f"Reihe zu kurz für {HOLDOUT_MONATE} Monate Holdout")
+
+        # Holdout: nur auf den Monaten davor trainieren
+        train, test = dff.iloc[:-HOLDOUT_MONATE], dff.iloc[-HOLDOUT_MONATE:]
+        holdout, _ = fit_forecast(modell, train.reset_index(drop=True), pd.DatetimeIndex(test['DATE']))
+        y_test = test['PASSENGERS'].to_numpy()
+        result['HOLDOUT_RMSE'] = float(np.sqrt(np.mean((holdout - y_test) ** 2)))
+        nonzero = y_test != 0
+        result['HOLDOUT_MAPE'] = float(np.mean(np.abs((holdout - y_test)[nonzero] / y_test[nonzero])) * 100) if nonzero.any() else None
+
+        # Dashboard-Prognose wie bei manueller Modellwahl
+        forecast, _ = fit_forecast(modell, dff, FUTURE_DATES)
+        mae, rmse, r2 = metrics(actual_values(_cube, route, FUTURE_DATES), forecast)
+        result.update(FORECAST=forecast.tolist(), MAE=float(mae), RMSE=float(rmse), R2=float(r2), FEHLER=None)
+    except Exception as e:
+        result['FEHLER'] = f"{type(e).__name__}: {e}"
+
+    result['SEKUNDEN'] = time.perf_counter() - started
+    return result
+
+
+def checkpoint_path(version):
+    return os.path.join(CHECKPOINT_DIR, version + ".jsonl")
+
+
+def load_checkpoint(version):
+    # Bereits fertige Ergebnisse; eine beim Absturz halb geschriebene letzte Zeile wird ignoriert
+    path = checkpoint_path(version)
+    if not os.path.exists(path):
+        return []
+    results = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return results
+
+
+def _open_checkpoint(version, fresh):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    # Checkpoints anderer Datenversionen sind wertlos
+    for name in os.listdir(CHECKPOINT_DIR):
+        if name != version + ".jsonl":
+            os.remove(os.path.join(CHECKPOINT_DIR, name))
+
+    path = checkpoint_path(version)
+    if fresh and os.path.exists(path):
+        os.remove(path)
+
+    # Eine unvollständige letzte Zeile abschneiden, bevor weitergeschrieben wird;
+    # neu schreiben und umbenennen, damit ein Absturz dabei den Checkpoint nicht leert
+    done = load_checkpoint(version)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for result in done:
+            f.write(json.dumps(result) + "\n")
+    os.replace(tmp, path)
+    return done, open(path, "a", encoding="utf-8")
+
+
+def run_tournament(df, version, modelle=MODELLE, workers=1, chunksize=2, fresh=False):
+    routes = ['ALL'] + [f"{origin}_{dest}" for origin, dest in build_route_index(df).index]
+    done, checkpoint = _open_checkpoint(version, fresh)
+    done = [r for r in done if r['MODELL'] in modelle]
+
+    finished = {(r['ROUTE'], r['MODELL']) for r in done}
+    tasks = [(route, modell) for route in routes for modell in modelle if (route, modell) not in finished]
+    print(f"{len(finished)} Ergebnisse aus dem Checkpoint, {len(tasks)} offen.")
+
+    cube = build_cube(df)
+    results = list(done)
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    with checkpoint:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cube,)) as pool:
+                outcomes = pool.map(_tournament_task, tasks, chunksize=chunksize)
+                for result in outcomes:
+                    checkpoint.write(json.dumps(result) + "\n")
+                    checkpoint.flush()
+                    results.append(result)
+        else:
+            _init_worker(cube)
+            for task in tasks:
+                result = _tournament_task(task)
+                checkpoint.write(json.dumps(result) + "\n")
+                checkpoint.flush()
+                results.append(result)
+
+    return pd.DataFrame(results)
+
+
+def select_winners(df_results):
+    # Je Route das Modell mit dem kleinsten Holdout-RMSE; Routen, auf denen kein
+    # Modell erfolgreich war (z. B. Prophet nicht installiert), werden ausgelassen
+    columns = ['ROUTE', 'MODELL', 'HOLDOUT_RMSE', 'HOLDOUT_MAPE', 'FORECAST', 'MAE', 'RMSE', 'R2']
+    # Sind alle Fits fehlgeschlagen, fehlen die Ergebnisspalten ganz
+    df_results = df_results.reindex(columns=list(dict.fromkeys([*df_results.columns, *columns, 'FEHLER'])))
+    ok = df_results[df_results['FEHLER'].isna() & np.isfinite(df_results['HOLDOUT_RMSE'].astype(float))]
+
+    ohne = sorted(set(df_results['ROUTE']) - set(ok['ROUTE']))
+    if ohne:
+        print(f"⚠️ {len(ohne)} Routen ohne erfolgreiches Modell ausgelassen: "
+              f"{', '.join(ohne[:10])}{' …' if len(ohne) > 10 else ''}")
+
+    best = ok.loc[ok.groupby('ROUTE')['HOLDOUT_RMSE'].idxmin()]
+    return best[columns].reset_index(drop=True)
+
+
+def load_winners(version, path=GEWINNER_PATH):
+    # {route: Eintrag wie im ForecastCache plus 'modell'}; leer, wenn nicht vorhanden oder veraltet
+    df_winners = read_store(version, path)
+    if df_winners is None:
+        return {}
+    return {
+        row.ROUTE: dict(store_entry(row), modell=row.MODELL)
+        for row in df_winners.itertuples(index=False)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Anzahl Prozesse (0 = alle Kerne)")
+    parser.add_argument("--modelle", default=",".join(MODELLE), help="Kommagetrennt, z. B. LR,HW")
+    parser.add_argument("--neu", action="store_true", help="Checkpoint verwerfen und von vorn beginnen")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    version = dataset_version("kennzahlen")
+    df = load_data()
+
+    df_results = run_tournament(df, version, modelle=args.modelle.split(","), workers=args.workers or None, fresh=args.neu)
+    df_winners = select_winners(df_results)
+    write_store(df_winners, version, GEWINNER_PATH)
+
+    print(df_winners['MODELL'].value_counts().to_string())
+    fehler = df_results['FEHLER'].notna().sum()
+    print(f"✅ Beste Modelle für {len(df_winners)} Routen gespeichert in {GEWINNER_PATH} "
+          f"({fehler} Fits fehlgeschlagen, {time.perf_counter() - started:.0f} s).")
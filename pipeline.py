@@ -0,0 +1,519 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+import traceback
+import modulefinder
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from datastore import DATA_DIR, dataset_version
+from forecast_models import MODELLE
+
+# === Pipeline mit Inhalts-Hashes ===
+# Die Aufbereitung als Stufen mit Eingaben, Ausgaben, Code und Parametern:
+#
+#   statistik     (match_connections)  T100-Jahresdateien -> daten/qualifikation_jahre.parquet
+#   qualifikation (match_connections)  Statistik, k       -> passed_connections.csv
+#   aggregation   (connections)        T100 + passed      -> daten/aggregiert
+#   kennzahlen    (Datenvorbereitung)  daten/aggregiert   -> daten/kennzahlen
+#   wuerfel       (metric_cube)        daten/kennzahlen   -> daten/wuerfel
+#   danach unabhängig voneinander: holt_winter, prognosen, hierarchie, turnier, segment
+#
+# Der Schlüssel einer Stufe ist ein SHA-1 über den Inhalt ihrer Eingaben und
+# Code-Dateien und über ihre Parameter. Stimmt er mit dem letzten erfolgreichen
+# Lauf überein und sind die Ausgaben unverändert vorhanden, wird die Stufe
+# übersprungen. Eine Änderung an forecast_models.py führt so nur prognosen,
+# hierarchie und turnier neu aus, ein anderes k beginnt bei qualifikation; die
+# T100-Rohdateien werden in beiden Fällen nicht gelesen.
+#
+# Datei-Hashes werden mit Größe und Änderungszeit in daten/pipeline.json
+# zwischengespeichert; unveränderte (auch große) Dateien werden nicht erneut
+# gelesen. Verzeichnisse (Parquet-Datasets) werden über den Inhalt ihrer Dateien
+# je Partition gehasht, ohne die zufälligen Dateinamen: gleicher Inhalt, gleicher
+# Hash, die Folgestufen bleiben stehen.
+# Stufen, deren Vorgänger fertig sind, laufen parallel in eigenen Prozessen (ein
+# frischer Prozess je Stufe, damit Laufzeit und Spitzenspeicher (max. RSS) je
+# Stufe getrennt gemessen werden). Ausgaben der Stufen landen in
+# logs/pipeline/<stufe>.log.
+
+STATUS_PATH = os.path.join(DATA_DIR, "pipeline.json")
+LOG_DIR = os.path.join("logs", "pipeline")
+
+PAKET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PARAMETER = {
+    "k": 100,
+    "jahre": [2022, 2023, 2024],
+    "hw_engine": "statsmodels",
+    "hw_init": None,  # None -> Standard der Engine (INIT_STANDARD in "Holt Winter komplett.py")
+    "modelle": list(MODELLE),
+    "hierarchie_methode": "wls",
+}
+
+# Verzeichnisse, deren erste Ebene die Datenversion ist (geht nicht in den Hash ein)
+VERSIONS_VERZEICHNISSE = {os.path.join(DATA_DIR, "wuerfel")}
+
+
+def jahresdatei(jahr):
+    return f"T_T100I_SEGMENT_ALL_CARRIER_{jahr}.csv"
+
+
+def _daten(name):
+    return os.path.join(DATA_DIR, name)
+
+
+# Eingaben/Ausgaben als Pfade relativ zum Arbeitsverzeichnis; "jahre" in den
+# Eingaben steht für die T100-Dateien der Jahresliste. versioniert: Ergebnis
+# trägt die Datenversion von daten/kennzahlen (Größe + Änderungszeit) nur als
+# Etikett; der Schlüssel hängt am Inhalt. Wird daten/kennzahlen mit gleichem
+# Inhalt neu geschrieben, wird nur das Etikett der Ausgaben umgestellt.
+# code: Module, die die Stufe selbst aufruft; was diese (auch in Funktionen) aus
+# dem Paket importieren, ergänzt code_dateien über modulefinder.
+STUFEN = {
+    "statistik": {
+        "eingaben": ["jahre"],
+        "ausgaben": [_daten("qualifikation_jahre.parquet")],
+        "code": ["match_connections.py"],
+        "parameter": ["jahre"],
+    },
+    "qualifikation": {
+        "eingaben": [_daten("qualifikation_jahre.parquet")],
+        "ausgaben": ["passed_connections.csv"],
+        "code": ["match_connections.py"],
+        "parameter": ["k"],
+    },
+    "aggregation": {
+        "eingaben": ["jahre", "passed_connections.csv"],
+        "ausgaben": [_daten("aggregiert")],
+        "code": ["connections.py"],
+        "parameter": ["jahre"],
+    },
+    "kennzahlen": {
+        "eingaben": [_daten("aggregiert")],
+        "ausgaben": [_daten("kennzahlen")],
+        "code": ["Datenvorbereitung.py"],
+        "parameter": [],
+    },
+    "wuerfel": {
+        "eingaben": [_daten("kennzahlen")],
+        "ausgaben": [_daten("wuerfel")],
+        "code": ["metric_cube.py"],
+        "parameter": [],
+        "versioniert": True,
+    },
+    "holt_winter": {
+        "eingaben": ["passed_connections.csv", _daten("kennzahlen"), _daten("wuerfel")],
+        "ausgaben": ["hw_ergebnisse.csv"],
+        "code": ["Holt Winter komplett.py"],
+        "parameter": ["hw_engine", "hw_init"],
+    },
+    "prognosen": {
+        "eingaben": [_daten("kennzahlen"), _daten("wuerfel")],
+        "ausgaben": [_daten("prognosen.parquet")],
+        "code": ["precompute_forecasts.py"],
+        "parameter": ["modelle"],
+        "versioniert": True,
+    },
+    "hierarchie": {
+        "eingaben": [_daten("kennzahlen"), _daten("wuerfel")],
+        "ausgaben": [_daten("hierarchie.parquet")],
+        "code": ["hierarchy.py", "precompute_forecasts.py"],
+        "parameter": ["hierarchie_methode"],
+        "versioniert": True,
+    },
+    "turnier": {
+        "eingaben": [_daten("kennzahlen"), _daten("wuerfel")],
+        "ausgaben": [_daten("beste_modelle.parquet")],
+        "code": ["model_tournament.py", "precompute_forecasts.py"],
+        "parameter": ["modelle"],
+        "versioniert": True,
+    },
+    "segment": {
+        "eingaben": [_daten("kennzahlen"), _daten("wuerfel")],
+        "ausgaben": [_daten("segment")],
+        "code": ["shared_dataset.py"],
+        "parameter": [],
+        "versioniert": True,
+    },
+}
+
+
+# === Stufen ===
+
+def _load_script(filename, name):
+    # Skripte mit Leerzeichen im Namen (z. B. "Holt Winter komplett.py")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PAKET_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _statistik(p):
+    import match_connections
+    match_connections.build_stats(*[jahresdatei(j) for j in p["jahre"]])
+
+
+def _qualifikation(p):
+    import match_connections
+    passed = match_connections.passing(match_connections.load_stats(), p["k"])
+    match_connections.write_passed(passed)
+    print(len(passed), "Verbindungen qualifiziert.")
+
+
+def _aggregation(p):
+    from connections import aggregate_streaming
+    from datastore import write_dataset
+    write_dataset(aggregate_streaming([jahresdatei(j) for j in p["jahre"]]), "aggregiert")
+
+
+def _kennzahlen(p):
+    from Datenvorbereitung import add_kennzahlen
+    from datastore import read_dataset, write_dataset
+    write_dataset(add_kennzahlen(read_dataset("aggregiert")), "kennzahlen")
+
+
+def _wuerfel(p):
+    from metric_cube import build_cube, save_cube
+    save_cube(build_cube(), dataset_version("kennzahlen"))
+
+
+def _holt_winter(p):
+    hwk = _load_script("Holt Winter komplett.py", "holt_winter_komplett")
+    df_results, _, df_fehler = hwk.evaluate(*hwk.load_data(), engine=p["hw_engine"], initialization=p["hw_init"])
+    df_results.to_csv("hw_ergebnisse.csv", index=False)
+    print(f"{len(df_results)} Verbindungen ausgewertet, {len(df_fehler)} mit Fehler.")
+
+
+def _prognosen(p):
+    from precompute_forecasts import load_data, precompute, write_store
+    write_store(precompute(load_data(), modelle=p["modelle"]), dataset_version("kennzahlen"))
+
+
+def _hierarchie(p):
+    from hierarchy import load_matrix, build, HIERARCHIE_PATH
+    from precompute_forecasts import write_store
+    write_store(build(*load_matrix(), methode=p["hierarchie_methode"]), dataset_version("kennzahlen"), HIERARCHIE_PATH)
+
+
+def _turnier(p):
+    from model_tournament import run_tournament, select_winners, GEWINNER_PATH
+    from precompute_forecasts import load_data, write_store
+    version = dataset_version("kennzahlen")
+    # Checkpoint hängt nur an der Datenversion; ein Lauf der Stufe (neuer Code oder
+    # neue Parameter) darf keine alten Ergebnisse übernehmen
+    df_results = run_tournament(load_data(), version, modelle=p["modelle"], fresh=True)
+    write_store(select_winners(df_results), version, GEWINNER_PATH)
+
+
+def _segment(p):
+    import shared_dataset
+    shared_dataset.publish(shared_dataset.build_frame(), dataset_version("kennzahlen"))
+
+
+_FUNKTIONEN = {
+    "statistik": _statistik,
+    "qualifikation": _qualifikation,
+    "aggregation": _aggregation,
+    "kennzahlen": _kennzahlen,
+    "wuerfel": _wuerfel,
+    "holt_winter": _holt_winter,
+    "prognosen": _prognosen,
+    "hierarchie": _hierarchie,
+    "turnier": _turnier,
+    "segment": _segment,
+}
+
+
+# Versionierte Stufen: Ausgaben auf eine neue Datenversion umstellen, ohne neu zu rechnen
+
+def _wuerfel_etikett(version):
+    from metric_cube import relabel_cube
+    relabel_cube(version)
+
+
+def _prognosen_etikett(version):
+    from precompute_forecasts import relabel_store
+    relabel_store(version)
+
+
+def _hierarchie_etikett(version):
+    from hierarchy import HIERARCHIE_PATH
+    from precompute_forecasts import relabel_store
+    relabel_store(version, HIERARCHIE_PATH)
+
+
+def _turnier_etikett(version):
+    from model_tournament import GEWINNER_PATH
+    from precompute_forecasts import relabel_store
+    relabel_store(version, GEWINNER_PATH)
+
+
+def _segment_etikett(version):
+    import shared_dataset
+    shared_dataset.relabel(version)
+
+
+_ETIKETTEN = {
+    "wuerfel": _wuerfel_etikett,
+    "prognosen": _prognosen_etikett,
+    "hierarchie": _hierarchie_etikett,
+    "turnier": _turnier_etikett,
+    "segment": _segment_etikett,
+}
+
+
+def _run_stage(name, parameter):
+    # Läuft im eigenen Prozess: (Sekunden, max. RSS in MB oder None)
+    os.makedirs(LOG_DIR, exist_ok=True)
+    started = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{name}.log"), "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            _FUNKTIONEN[name](parameter)
+        except Exception:
+            traceback.print_exc()
+            raise
+    sekunden = time.perf_counter() - started
+
+    try:
+        import resource
+        # Größter Prozess der Stufe, auch Pool-Prozesse (z. B. je Jahr in match_connections)
+        peak = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) / 1024
+        if sys.platform == "darwin":
+            peak /= 1024
+    except ImportError:
+        # Windows: kein resource-Modul
+        peak = None
+    return sekunden, peak
+
+
+# === Hashes ===
+
+def load_status():
+    if not os.path.exists(STATUS_PATH):
+        return {"dateien": {}, "stufen": {}}
+    with open(STATUS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_status(status):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp = STATUS_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, STATUS_PATH)
+
+
+def file_hash(path, dateien):
+    # SHA-1 des Inhalts; über Größe und Änderungszeit aus dem Zwischenspeicher dateien
+    st = os.stat(path)
+    eintrag = dateien.get(path)
+    if eintrag is not None and eintrag[:2] == [st.st_size, st.st_mtime_ns]:
+        return eintrag[2]
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    dateien[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+    return dateien[path][2]
+
+
+def path_hash(path, dateien):
+    # Datei: Inhalt; Verzeichnis: Inhalte je Unterverzeichnis, ohne Dateinamen; fehlt: None
+    if os.path.isfile(path):
+        return file_hash(path, dateien)
+    if not os.path.isdir(path):
+        return None
+
+    teile = sorted(
+        f"{_relpath(dirpath, path)}:{file_hash(os.path.join(dirpath, f), dateien)}"
+        for dirpath, _, filenames in os.walk(path)
+        for f in filenames
+        if not f.endswith(".tmp")
+    )
+    return hashlib.sha1(";".join(teile).encode()).hexdigest()
+
+
+def _relpath(dirpath, path):
+    rel = os.path.relpath(dirpath, path)
+    if path in VERSIONS_VERZEICHNISSE:
+        rel = os.path.join(*rel.split(os.sep)[1:]) if os.sep in rel else "."
+    return rel
+
+
+def _eingaben(name, parameter):
+    pfade = []
+    for eingabe in STUFEN[name]["eingaben"]:
+        pfade += [jahresdatei(j) for j in parameter["jahre"]] if eingabe == "jahre" else [eingabe]
+    return pfade
+
+
+def code_dateien(name):
+    # code der Stufe plus alle Module aus PAKET_DIR, die davon (transitiv) importiert werden
+    finder = modulefinder.ModuleFinder(path=[PAKET_DIR])
+    for f in STUFEN[name]["code"]:
+        finder.run_script(os.path.join(PAKET_DIR, f))
+    gefunden = {
+        os.path.relpath(module.__file__, PAKET_DIR)
+        for module in finder.modules.values()
+        if module.__file__ and os.path.dirname(os.path.abspath(module.__file__)) == PAKET_DIR
+    }
+    return sorted(gefunden | set(STUFEN[name]["code"]))
+
+
+def stage_key(name, parameter, dateien):
+    stufe = STUFEN[name]
+    inhalt = {
+        "eingaben": {path: path_hash(path, dateien) for path in _eingaben(name, parameter)},
+        "code": {f: file_hash(os.path.join(PAKET_DIR, f), dateien) for f in code_dateien(name)},
+        "parameter": {p: parameter[p] for p in stufe["parameter"]},
+    }
+    fehlend = [path for path, h in inhalt["eingaben"].items() if h is None]
+    if fehlend:
+        raise FileNotFoundError(f"Stufe {name}: Eingaben fehlen: {', '.join(fehlend)}")
+    return hashlib.sha1(json.dumps(inhalt, sort_keys=True).encode()).hexdigest()
+
+
+def up_to_date(name, key, status):
+    eintrag = status["stufen"].get(name)
+    if eintrag is None or eintrag["schluessel"] != key:
+        return False
+    return all(path_hash(path, status["dateien"]) == h for path, h in eintrag["ausgaben"].items())
+
+
+# === Ablauf ===
+
+def dependencies(namen):
+    # Vorgänger je Stufe: Stufen (unter namen), deren Ausgaben sie liest
+    erzeugt = {out: name for name in namen for out in STUFEN[name]["ausgaben"]}
+    return {
+        name: {erzeugt[e] for e in STUFEN[name]["eingaben"] if e in erzeugt and erzeugt[e] != name}
+        for name in namen
+    }
+
+
+def run(parameter=None, stufen=None, workers=2, force=()):
+    # Führt die Stufen (Standard: alle) in Abhängigkeitsreihenfolge aus.
+    # force: Stufen, die unabhängig vom Schlüssel neu laufen.
+    # Rückgabe: {stufe: "ausgefuehrt" | "aktuell" | "fehler" | "abgebrochen"}
+    parameter = {**PARAMETER, **(parameter or {})}
+    namen = [name for name in STUFEN if stufen is None or name in stufen]
+    vorgaenger = dependencies(namen)
+    status = load_status()
+    ergebnis = {}
+    laufend = {}
+
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        while len(ergebnis) < len(namen):
+            for name in namen:
+                if len(laufend) >= workers:
+                    break
+                if name in ergebnis or name in laufend.values() or not vorgaenger[name] <= ergebnis.keys():
+                    continue
+                if any(ergebnis[v] in ("fehler", "abgebrochen") for v in vorgaenger[name]):
+                    ergebnis[name] = "abgebrochen"
+                    print(f"⏭️  {name}: abgebrochen (Vorgänger fehlgeschlagen)")
+                    continue
+                try:
+                    key = stage_key(name, parameter, status["dateien"])
+                except FileNotFoundError as e:
+                    ergebnis[name] = "fehler"
+                    print(f"❌ {e}")
+                    continue
+                if name not in force and up_to_date(name, key, status):
+                    ergebnis[name] = "aktuell"
+                    eintrag = status["stufen"][name]
+                    version = dataset_version("kennzahlen") if STUFEN[name].get("versioniert") else None
+                    if eintrag.get("datenversion") != version:
+                        _ETIKETTEN[name](version)
+                        eintrag.update(
+                            datenversion=version,
+                            ausgaben={path: path_hash(path, status["dateien"]) for path in STUFEN[name]["ausgaben"]},
+                        )
+                        save_status(status)
+                        print(f"✔️  {name}: unverändert, Datenversion {version}")
+                    else:
+                        print(f"✔️  {name}: unverändert")
+                    continue
+                print(f"▶️  {name} ...")
+                laufend[pool.submit(_run_stage, name, parameter)] = name
+                status["stufen"].setdefault(name, {})["schluessel_neu"] = key
+
+            if not laufend:
+                continue
+
+            fertig, _ = wait(laufend, return_when=FIRST_COMPLETED)
+            for future in fertig:
+                name = laufend.pop(future)
+                eintrag = status["stufen"][name]
+                key = eintrag.pop("schluessel_neu")
+                try:
+                    sekunden, peak = future.result()
+                except Exception as e:
+                    ergebnis[name] = "fehler"
+                    print(f"❌ {name}: {type(e).__name__}: {e} (siehe {os.path.join(LOG_DIR, name + '.log')})")
+                    continue
+
+                eintrag.update(
+                    schluessel=key,
+                    datenversion=dataset_version("kennzahlen") if STUFEN[name].get("versioniert") else None,
+                    ausgaben={path: path_hash(path, status["dateien"]) for path in STUFEN[name]["ausgaben"]},
+                    sekunden=round(sekunden, 3),
+                    speicher_peak_mb=None if peak is None else round(peak, 1),
+                    zeit=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                )
+                ergebnis[name] = "ausgefuehrt"
+                save_status(status)
+                print(f"✅ {name}: {sekunden:.1f} s" + (f", {peak:.0f} MB" if peak is not None else ""))
+
+    # Leere Einträge nie gelaufener Stufen (Fehler vor dem ersten Erfolg) entfernen
+    status["stufen"] = {name: e for name, e in status["stufen"].items() if "schluessel" in e}
+    save_status(status)
+    return ergebnis
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stufen", help=f"Kommagetrennt, Standard alle: {','.join(STUFEN)}")
+    parser.add_argument("--force", default="", help="Diese Stufen immer neu ausführen (kommagetrennt, 'alle')")
+    parser.add_argument("--workers", type=int, default=2, help="Gleichzeitige Stufen")
+    parser.add_argument("-k", type=int, default=PARAMETER["k"])
+    parser.add_argument("--jahre", default=",".join(map(str, PARAMETER["jahre"])))
+    parser.add_argument("--modelle", default=",".join(PARAMETER["modelle"]))
+    parser.add_argument("--hw-engine", choices=["statsmodels", "batch"], default=PARAMETER["hw_engine"])
+    parser.add_argument("--hw-init", choices=["estimated", "legacy-heuristic"], default=PARAMETER["hw_init"],
+                        help="Standard je Engine; batch mit estimated ist nicht validiert")
+    parser.add_argument("--methode", choices=["bu", "ols", "wls"], default=PARAMETER["hierarchie_methode"])
+    args = parser.parse_args()
+
+    stufen = args.stufen.split(",") if args.stufen else None
+    unbekannt = set(stufen or []) - STUFEN.keys()
+    if unbekannt:
+        parser.error(f"Unbekannte Stufen: {', '.join(sorted(unbekannt))}")
+    force = set(STUFEN) if args.force == "alle" else set(filter(None, args.force.split(",")))
+
+    started = time.perf_counter()
+    ergebnis = run(
+        {
+            "k": args.k,
+            "jahre": [int(j) for j in args.jahre.split(",")],
+            "modelle": args.modelle.split(","),
+            "hw_engine": args.hw_engine,
+            "hw_init": args.hw_init,
+            "hierarchie_methode": args.methode,
+        },
+        stufen=stufen,
+        workers=args.workers,
+        force=force,
+    )
+
+    gelaufen = sum(e == "ausgefuehrt" for e in ergebnis.values())
+    print(f"\n{gelaufen} von {len(ergebnis)} Stufen ausgeführt ({time.perf_counter() - started:.1f} s), "
+          f"Zeiten und Speicher in {STATUS_PATH}.")
+    if any(e in ("fehler", "abgebrochen") for e in ergebnis.values()):
+        sys.exit(1)
@@ -0,0 +1,165 @@
+import os
+import time
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from datastore import read_dataset, dataset_version, DATA_DIR
+from route_index import build_route_index
+from connection_index import CONNECTION_KEYS
+from metric_cube import build_cube, SUMMEN
+from forecast_models import MODELLE, FUTURE_DATES, fit_forecast, metrics, route_series, actual_values
+
+# === Vorberechnung aller Dashboard-Prognosen ===
+# Für jede Route (ORIGIN_DEST) und 'ALL' werden alle Modelle aus forecast_models
+# mit derselben Konfiguration wie im Dashboard gefittet. Ergebnis ist eine kleine
+# Parquet-Datei (eine Zeile je Route und Modell) mit Prognose und Kennzahlen 2024.
+# Die Datenversion steht in den Metadaten; passt sie nicht zum geladenen
+# Datensatz, ignoriert das Dashboard die Datei.
+
+STORE_PATH = os.path.join(DATA_DIR, "prognosen.parquet")
+
+_META_VERSION = b"psba_daten_version"
+
+_cube = None
+
+
+def load_data():
+    # Verbindungsschlüssel und Summen für den Würfel, AUSLASTUNG für die Routenübersicht
+    df = read_dataset("kennzahlen", columns=CONNECTION_KEYS + ['YEAR', 'MONTH'] + SUMMEN + ['AUSLASTUNG'])
+    df['DATE'] = pd.to_datetime(df[['YEAR', 'MONTH']].assign(DAY=1))
+    return df
+
+
+def _init_worker(cube):
+    global _cube
+    warnings.simplefilter("ignore")
+    _cube = cube
+
+
+def _forecast_task(task):
+    route, modell = task
+    started = time.perf_counter()
+    try:
+        dff = route_series(_cube, route)
+        forecast, _ = fit_forecast(modell, dff, FUTURE_DATES)
+        mae, rmse, r2 = metrics(actual_values(_cube, route, FUTURE_DATES), forecast)
+        error = None
+    except Exception as e:
+        forecast, mae, rmse, r2 = None, None, None, None
+        error = f"{type(e).__name__}: {e}"
+
+    return {
+        'ROUTE': route,
+        'MODELL': modell,
+        'FORECAST': None if forecast is None else forecast.tolist(),
+        'MAE': mae,
+        'RMSE': rmse,
+        'R2': r2,
+        'FEHLER': error,
+        'SEKUNDEN': time.perf_counter() - started,
+    }
+
+
+def precompute(df, modelle=MODELLE, workers=1, chunksize=4):
+    routes = ['ALL'] + [f"{origin}_{dest}" for origin, dest in build_route_index(df).index]
+    tasks = [(route, modell) for route in routes for modell in modelle]
+    cube = build_cube(df)
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cube,)) as pool:
+            rows = list(pool.map(_forecast_task, tasks, chunksize=chunksize))
+    else:
+        _init_worker(cube)
+        rows = [_forecast_task(task) for task in tasks]
+
+    return pd.DataFrame(rows)
+
+
+def write_store(df_store, version, path=STORE_PATH):
+    import pyarrow as pa
+
+    _write_table(pa.Table.from_pandas(df_store, preserve_index=False), version, path)
+
+
+def relabel_store(version, path=STORE_PATH):
+    # Inhalt unverändert, nur die Datenversion umstellen (Daten gleichen Inhalts neu geschrieben)
+    import pyarrow.parquet as pq
+
+    _write_table(pq.read_table(path), version, path)
+
+
+def _write_table(table, version, path):
+    import pyarrow.parquet as pq
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[_META_VERSION] = version.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def read_store(version, path=STORE_PATH):
+    # Gespeicherte Tabelle, None wenn nicht vorhanden oder zu einer anderen Datenversion
+    if not os.path.exists(path):
+        return None
+
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    stored = (table.schema.metadata or {}).get(_META_VERSION, b"").decode()
+    if stored != version:
+        print(f"⚠️ {path} veraltet ({stored} != {version}), wird ignoriert.")
+        return None
+    return table.to_pandas()
+
+
+def store_entry(row):
+    # Eintrag wie im ForecastCache
+    return {
+        'forecast': np.asarray(row.FORECAST, dtype=float),
+        'fitted': None,
+        'mae': row.MAE,
+        'rmse': row.RMSE,
+        'r2': row.R2,
+    }
+
+
+def load_store(version, path=STORE_PATH):
+    # {(route, modell): Eintrag}; leer, wenn nicht vorhanden oder veraltet
+    df_store = read_store(version, path)
+    if df_store is None:
+        return {}
+    return {
+        (row.ROUTE, row.MODELL): store_entry(row)
+        for row in df_store[df_store['FEHLER'].isna()].itertuples(index=False)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Anzahl Prozesse (0 = alle Kerne)")
+    parser.add_argument("--modelle", default=",".join(MODELLE), help="Kommagetrennt, z. B. LR,HW")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    version = dataset_version("kennzahlen")
+    df = load_data()
+
+    df_store = precompute(df, modelle=args.modelle.split(","), workers=args.workers or None)
+    write_store(df_store, version)
+
+    ok = df_store['FEHLER'].isna()
+    print(df_store.groupby('MODELL')['SEKUNDEN'].sum().round(1))
+    print(f"✅ {ok.sum()} Prognosen gespeichert in {STORE_PATH} ({time.perf_counter() - started:.0f} s).")
+    if (~ok).any():
+        print(f"⚠️ {(~ok).sum()} Prognosen fehlgeschlagen.")
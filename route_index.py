@@ -0,0 +1,34 @@
+import numpy as np
+
+# === Routenübersicht (ORIGIN, DEST) ===
+# Wird einmal beim Laden gebaut und ist nach ⌀ Passagieren absteigend sortiert.
+# Der Mindest-Passagier-Filter ist damit eine Binärsuche plus Slice, die
+# Statistik-Tabelle ein Zugriff über den Index (ORIGIN, DEST).
+
+
+def build_route_index(df):
+    index = df.groupby(['ORIGIN', 'DEST'], observed=True).agg(
+        AVG_PAX=('PASSENGERS', 'mean'),
+        MIN_PAX=('PASSENGERS', 'min'),
+        MAX_PAX=('PASSENGERS', 'max'),
+        STD_PAX=('PASSENGERS', 'std'),
+        AVG_AUSLASTUNG=('AUSLASTUNG', 'mean'),
+    )
+    return index.sort_values('AVG_PAX', ascending=False, kind='stable')
+
+
+def route_options(index):
+    # Dropdown-Einträge in derselben Reihenfolge wie der Index
+    return [
+        {'label': f"{origin} → {dest}", 'value': f"{origin}_{dest}"}
+        for origin, dest in index.index
+    ]
+
+
+def count_above(index, min_passagiere):
+    # Anzahl Routen mit ⌀ Passagieren >= min_passagiere (AVG_PAX ist absteigend sortiert)
+    return int(np.searchsorted(-index['AVG_PAX'].to_numpy(), -min_passagiere, side='right'))
+
+
+def route_stats(index, origin, dest):
+    return index.loc[(origin, dest)]
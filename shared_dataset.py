@@ -0,0 +1,136 @@
+import os
+import time
+
+import pandas as pd
+
+from datastore import read_dataset, dataset_version, DATA_DIR
+from connection_index import ROUTE_KEYS
+
+# === Gemeinsames Dataset für mehrere Dashboard-Prozesse ===
+# Der Dashboard-Frame (Spalten, DATE, sortiert wie ConnectionIndex über
+# ROUTE_KEYS) wird einmal als unkomprimierte Arrow-IPC-Datei unter
+# daten/segment/dashboard-<Datenversion>.arrow abgelegt. Jeder Worker bildet sie
+# per mmap nur lesend ab; to_pandas(split_blocks=True) erzeugt Sichten auf die
+# Seiten der Datei statt Kopien, alle Prozesse teilen sich denselben Page Cache.
+#
+# Veröffentlichen: Datei unter temporärem Namen schreiben, umbenennen, dann den
+# Zeiger daten/segment/AKTUELL (enthält die Version) per os.replace umsetzen.
+# Worker, die noch das alte Segment abgebildet haben, lesen ungestört weiter;
+# unter Linux bleibt die gelöschte Datei bis zum letzten munmap erhalten.
+
+SEGMENT_DIR = os.path.join(DATA_DIR, "segment")
+ZEIGER_PATH = os.path.join(SEGMENT_DIR, "AKTUELL")
+
+DASHBOARD_SPALTEN = ['ORIGIN', 'DEST', 'YEAR', 'MONTH', 'PASSENGERS', 'AUSLASTUNG']
+
+
+def build_frame():
+    # Frame wie im Dashboard benötigt, schon in der Reihenfolge von ConnectionIndex
+    daten = read_dataset("kennzahlen", columns=DASHBOARD_SPALTEN)
+    daten['DATE'] = pd.to_datetime(daten[['YEAR', 'MONTH']].assign(DAY=1))
+    return daten.sort_values(ROUTE_KEYS + ['YEAR', 'MONTH'], kind='stable', ignore_index=True)
+
+
+def segment_path(version):
+    return os.path.join(SEGMENT_DIR, f"dashboard-{version}.arrow")
+
+
+def current_version():
+    # Version des veröffentlichten Segments, None wenn noch keins existiert
+    try:
+        with open(ZEIGER_PATH, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(df, version):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    os.makedirs(SEGMENT_DIR, exist_ok=True)
+    path = segment_path(version)
+    tmp = f"{path}.{os.getpid()}.tmp"
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+    _set_pointer(version)
+    _remove_old(version)
+    return path
+
+
+def relabel(version):
+    # Veröffentlichtes Segment (gleicher Inhalt) unter einer neuen Datenversion
+    alt = current_version()
+    path = segment_path(version)
+    if not os.path.exists(path):
+        if alt is None or not os.path.exists(segment_path(alt)):
+            # Kein Segment zum Umbenennen (Zeiger oder Datei fehlt) -> neu bauen
+            return publish(build_frame(), version)
+        os.replace(segment_path(alt), path)
+    _set_pointer(version)
+    _remove_old(version)
+    return path
+
+
+def _set_pointer(version):
+    tmp = f"{ZEIGER_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, ZEIGER_PATH)
+
+
+def attach(version=None):
+    # (Frame, Version) als nur lesende Sicht auf das Segment; None ohne Segment
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    for _ in range(3):
+        wanted = version or current_version()
+        if wanted is None:
+            return None
+        try:
+            source = pa.memory_map(segment_path(wanted), "r")
+        except FileNotFoundError:
+            # Zwischen Zeiger lesen und Öffnen ersetzt -> Zeiger neu lesen
+            if version is not None:
+                raise
+            time.sleep(0.05)
+            continue
+        table = ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True), wanted
+
+    raise FileNotFoundError(f"Kein lesbares Segment unter {SEGMENT_DIR}")
+
+
+def load_shared():
+    # Segment, auf das der Zeiger zeigt (nicht die lokale Datenversion, die sich
+    # beim Veröffentlichen schon geändert haben kann); ohne veröffentlichtes
+    # Segment baut es der erste Worker
+    geladen = attach()
+    if geladen is None:
+        publish(build_frame(), dataset_version("kennzahlen"))
+        geladen = attach()
+    return geladen
+
+
+def _remove_old(version):
+    keep = os.path.basename(segment_path(version))
+    for name in os.listdir(SEGMENT_DIR):
+        if name.startswith("dashboard-") and name != keep and not name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(SEGMENT_DIR, name))
+            except OSError:
+                # z. B. unter Windows noch abgebildet; beim nächsten Veröffentlichen
+                pass
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    version = dataset_version("kennzahlen")
+    path = publish(build_frame(), version)
+    print(f"✅ Segment {path} veröffentlicht ({os.path.getsize(path) / 2**20:.1f} MB, "
+          f"{time.perf_counter() - started:.1f} s).")